@@ -2,20 +2,31 @@
 Main application file for Twitch VOD Archiver
 """
 
-import datetime
+import re
+import time
+import importlib
+import shutil
+import functools
 import threading
+import collections
+import queue
+import concurrent.futures
 import os
 import logging
 from utils.logging_utils import setup_logging
 import asyncio
+from tkinter import filedialog
 
-import yt_dlp
-import customtkinter as ctk
+# yt_dlp is imported where it's used: it loads hundreds of extractor modules
+# and isn't needed to get the window on screen
 
 from twitch_ui import TwitchUI
-from ytdlp_config import FETCH_OPTS, DOWNLOAD_OPTS, DEFAULT_OUTPUT_TEMPLATE
+from ytdlp_config import FETCH_OPTS, DOWNLOAD_OPTS, DEFAULT_OUTPUT_TEMPLATE, MAX_CONCURRENT_DOWNLOADS
 from twitch_chat import TwitchChatRetriever, extract_video_id
 from twitch_chat_ui import TwitchChatUI
+from utils.config_utils import CHANNEL_LISTING_CACHE_FILE, DOWNLOAD_QUEUE_FILE
+from utils.cache_utils import SQLiteCache
+from utils.queue_utils import DownloadQueueStore
 
 # Configure logging using shared utility
 setup_logging(log_level=logging.INFO, log_file="twitch_archiver.log")
@@ -23,12 +34,60 @@ logger = logging.getLogger("TwitchVODArchiver")
 chat_logger = logging.getLogger("TwitchChatRetriever")
 chat_logger.setLevel(logging.DEBUG)  # Set chat logger to DEBUG level
 
+# Seconds between progress bar refreshes on the UI thread
+PROGRESS_UPDATE_INTERVAL = 0.1
+
+# Seconds between checks for resume while a download is paused
+PAUSE_POLL_INTERVAL = 0.25
+
+# Milliseconds between drains of the pending UI operations queue (~60 Hz)
+UI_DRAIN_INTERVAL_MS = 16
+
+# Require this much more free disk space than a VOD's estimated size before downloading
+DISK_SPACE_MARGIN = 1.1
+
+# Fetched VODs are added to the list at most this many per UI tick...
+VOD_LIST_BATCH_SIZE = 64
+
+# ...with this many milliseconds between ticks, so long listings don't freeze the window
+VOD_LIST_DRAIN_INTERVAL_MS = 50
+
+# Twitch login names: letters, digits and underscores. Rejecting anything else up
+# front avoids a slow round trip through yt-dlp's extractor error path
+_CHANNEL_NAME_RE = re.compile(r'[A-Za-z0-9_]{3,25}')
+
+# Channel page listing the VODs for a filter from ui_config.VIDEO_FILTERS
+CHANNEL_URL_TEMPLATE = "https://www.twitch.tv/{channel}/{filter}"
+
+# Seconds a channel's VOD listing is reused before fetching it from Twitch again
+CHANNEL_LISTING_CACHE_TTL = 60 * 60
+
+@functools.lru_cache(maxsize=4096)
+def _format_upload_date(upload_date: str) -> str:
+    """Turn yt-dlp's YYYYMMDD upload date into YYYY-MM-DD"""
+    # The format is fixed-width, so slicing is enough and much cheaper than strptime
+    if len(upload_date) != 8 or not upload_date.isdigit():
+        return 'Unknown date'
+    return f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:]}"
+
+def _free_disk_space(path: str) -> int:
+    """Free bytes on the disk holding path, which may not have been created yet"""
+    # A restored download's folder may have been removed since it was queued;
+    # yt-dlp recreates it, so measure the nearest folder that does exist
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
 class TwitchVODArchiver:
     def __init__(self):
         self.ui = TwitchUI()
-        self.is_paused = False
-        self.current_ydl = None
-        self.download_thread = None
+        # Set while downloads are paused; running downloads wait in their progress hook
+        self._pause_event = threading.Event()
+        # Set when the application is closing to abort running downloads
+        self._stop_event = threading.Event()
         self._setup_callbacks()
         # Disable pause button initially since no downloads are active
         self.ui.pause_button.configure(state="disabled")
@@ -38,9 +97,90 @@ class TwitchVODArchiver:
         self.chat_retriever = None
         logger.info("Chat UI initialized")
 
+        # VODs download in parallel on a bounded pool; chat downloads share one
+        # worker so the retriever's HTTP session is never used from two threads
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="vod-download"
+        )
+        self._chat_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="chat-download"
+        )
+        # Event loop for chat downloads, created on the chat thread and kept for the
+        # life of the app so the retriever's connections to Twitch stay open between VODs
+        self._chat_loop = None
+        # Chat download currently running on _chat_loop, so closing the app can cancel it
+        self._chat_task = None
+        # Queued and running chat downloads; only touched on the Tk thread
+        self._chat_futures = set()
+        # Each download worker's reusable YoutubeDL instance
+        self._ydl_local = threading.local()
+        # YoutubeDL shared by channel fetches, created by the first one
+        self._ydl_fetch = None
+        # Recent channel listings, so fetching the same channel again is instant
+        self._listing_cache = SQLiteCache(CHANNEL_LISTING_CACHE_FILE, "channel_listings", CHANNEL_LISTING_CACHE_TTL)
+        # Download folder already created by download_selected
+        self._prepared_download_path = None
+        self._active_futures = set()
+        # URLs of VODs queued or downloading, so pressing Download again doesn't
+        # start a second worker on the same file; only touched on the Tk thread
+        self._pending_urls = set()
+        # Latest progress (0-1) of each running VOD/chat download, keyed by task.
+        # Workers only overwrite their slot; the UI thread polls it on a timer
+        self._progress = {}
+        self._progress_lock = threading.Lock()
+        self.ui.after(int(PROGRESS_UPDATE_INTERVAL * 1000), self._pump_progress)
+
+        # Pending UI operations posted by worker threads, drained on the Tk thread
+        self._ui_ops = collections.deque()
+        self._ui_lock = threading.Lock()
+        self.ui.after(UI_DRAIN_INTERVAL_MS, self._drain_ui)
+
+        # Queued VODs are also recorded on disk until they finish downloading
+        self._queue_store = DownloadQueueStore(DOWNLOAD_QUEUE_FILE)
+        # Folder each restored VOD was originally queued for, keyed by URL
+        self._restored_paths = {}
+        self._restore_download_queue()
+
+    def _restore_download_queue(self):
+        """List VODs that were still queued when the app last closed, ready to resume"""
+        pending = self._queue_store.pending()
+        if not pending:
+            return
+        for url, title, download_path in pending:
+            self.ui.add_restored_vod(title, url)
+            self._restored_paths[url] = download_path
+        self.ui.update_status(
+            f"Restored {len(pending)} unfinished downloads, press Download Selected to resume (unticked ones are discarded)"
+        )
+        logger.info(f"Restored {len(pending)} unfinished downloads from the last session")
+
+    def _post(self, fn):
+        """Queue a callable to be run on the Tk main thread"""
+        with self._ui_lock:
+            self._ui_ops.append(fn)
+
+    def _drain_ui(self):
+        """Run all pending UI operations in one batch, then reschedule"""
+        with self._ui_lock:
+            ops = self._ui_ops
+            self._ui_ops = collections.deque()
+        for fn in ops:
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Error running UI operation: {e}", exc_info=True)
+        self.ui.after(UI_DRAIN_INTERVAL_MS, self._drain_ui)
+
+    @property
+    def is_paused(self) -> bool:
+        """Whether downloads are currently paused"""
+        return self._pause_event.is_set()
+
     def _setup_callbacks(self):
         """Set up button callbacks"""
+        self.ui.protocol("WM_DELETE_WINDOW", self._on_close)
         self.ui.fetch_button.configure(command=self.fetch_vods)
+        self.ui.refresh_button.configure(command=lambda: self.fetch_vods(refresh=True))
         self.ui.browse_button.configure(command=self.browse_path)
         self.ui.download_button.configure(command=self.download_selected)
         self.ui.select_all_button.configure(command=self.select_all_vods)
@@ -48,74 +188,144 @@ class TwitchVODArchiver:
 
     def browse_path(self):
         """Open directory browser"""
-        path = ctk.filedialog.askdirectory()
+        path = filedialog.askdirectory(parent=self.ui)
         if path:
             self.ui.path_entry.delete(0, "end")
             self.ui.path_entry.insert(0, path)
             logger.info(f"Download path set to: {path}")
 
-    def fetch_vods(self):
-        """Fetch VODs for the specified channel"""
+    def fetch_vods(self, refresh=False):
+        """Fetch VODs for the specified channel, bypassing the listing cache if refresh is set"""
         channel_name = self.ui.get_channel_name()
         if not channel_name:
             self.ui.update_status("Please enter a channel name")
             return
+        if not _CHANNEL_NAME_RE.fullmatch(channel_name):
+            self.ui.update_status(f"Invalid channel name: {channel_name}")
+            return
 
         self.ui.update_status(f"Fetching VODs for {channel_name}...")
         self.ui.fetch_button.configure(state="disabled")
+        self.ui.refresh_button.configure(state="disabled")
         self.ui.clear_vod_list()
+        self._restored_paths.clear()
 
-        thread = threading.Thread(target=self._fetch_vods_thread, args=(channel_name,))
+        # Each fetch gets its own queue so rows from an earlier fetch can't leak into this list
+        rows_queue = queue.SimpleQueue()
+        thread = threading.Thread(target=self._fetch_vods_thread, args=(channel_name, rows_queue, refresh))
         thread.daemon = True
         thread.start()
+        self.ui.after(VOD_LIST_DRAIN_INTERVAL_MS, self._drain_vod_rows, rows_queue)
         logger.info(f"Started fetching VODs for channel: {channel_name}")
 
-    def _fetch_vods_thread(self, channel_name: str):
-        """Background thread for fetching VODs"""
+    def _drain_vod_rows(self, rows_queue):
+        """Add the next batch of fetched VODs to the list, rescheduling until the fetch is done"""
+        rows = []
+        finished = False
+        try:
+            while len(rows) < VOD_LIST_BATCH_SIZE:
+                row = rows_queue.get_nowait()
+                if row is None:
+                    finished = True
+                    break
+                rows.append(row)
+        except queue.Empty:
+            pass
+        if rows:
+            self.ui.add_vod_checkboxes_batch(rows)
+        if finished:
+            # Only allow another fetch once every row of this one is in the list,
+            # otherwise this loop would keep adding them to the next channel's list
+            self.ui.fetch_button.configure(state="normal")
+            self.ui.refresh_button.configure(state="normal")
+        elif not self._stop_event.is_set():
+            self.ui.after(VOD_LIST_DRAIN_INTERVAL_MS, self._drain_vod_rows, rows_queue)
+
+    def _fetch_vods_thread(self, channel_name: str, rows_queue, refresh=False):
+        """Background thread for fetching VODs; rows go to rows_queue, ending with None"""
+        import yt_dlp
+
         try:
             filter_url = self.ui.get_selected_filter()
-            url = f"https://www.twitch.tv/{channel_name}/{filter_url}"
+            url = CHANNEL_URL_TEMPLATE.format(channel=channel_name, filter=filter_url)
+            # Channel names are case-insensitive on Twitch
+            cache_key = f"{channel_name.lower()}/{filter_url}"
+
+            rows = None if refresh else self._listing_cache.get(cache_key)
+            if rows is not None:
+                logger.info(f"Using cached VOD listing for {channel_name}")
+                for row in rows:
+                    rows_queue.put(tuple(row))
+                self._post(lambda: self.ui.update_status(f"Found {len(rows)} VODs (cached, press Refresh to update)"))
+                return
             
             logger.info(f"Fetching VODs from URL: {url}")
-            ydl_opts = FETCH_OPTS.copy()
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                result = ydl.extract_info(url, download=False)
-                entries = result.get('entries', [])
-
-                for vod in entries:
-                    title = vod.get('title', 'Untitled')
-                    duration = vod.get('duration', 0)
-                    upload_date = vod.get('upload_date', '')
-                    if upload_date:
-                        try:
-                            upload_date = datetime.datetime.strptime(upload_date, '%Y%m%d').strftime('%Y-%m-%d')
-                        except ValueError:
-                            upload_date = 'Unknown date'
-                    
-                    self.ui.after(0, lambda t=title, d=duration, ud=upload_date, u=vod.get('url'):
-                        self.ui.add_vod_checkbox(t, d, ud, u))
+            # Only one fetch runs at a time (the button is disabled meanwhile), so the
+            # instance and its open connections to Twitch can be kept between fetches
+            if self._ydl_fetch is None:
+                # yt-dlp writes defaults into its params; keep them out of the shared prototype
+                self._ydl_fetch = yt_dlp.YoutubeDL(collections.ChainMap({}, FETCH_OPTS))
+            ydl = self._ydl_fetch
+            # Without processing, a channel listing comes back as soon as its first
+            # page is requested and its entries are a generator that pages on demand,
+            # so each VOD reaches the list while later pages are still being fetched
+            result = ydl.extract_info(url, download=False, process=False)
+            if result is None:
+                raise Exception(f"Could not fetch VOD listing from {url}")
+            if result.get('_type') not in ('playlist', 'multi_video'):
+                # Redirects and single videos still need yt-dlp's usual resolution
+                result = ydl.process_ie_result(result, download=False)
+            entries = result.get('entries') or []
 
-                self.ui.after(0, lambda: self.ui.update_status(f"Found {len(entries)} VODs"))
-                logger.info(f"Found {len(entries)} VODs for {channel_name}")
+            rows = []
+            # Listings are paged, so a VOD can show up twice if the channel
+            # changes while we page through it; keep the first copy
+            seen_urls = set()
+            for vod in entries:
+                if not vod:
+                    # Entries that failed to extract are None with ignoreerrors
+                    continue
+                title = vod.get('title', 'Untitled')
+                duration = vod.get('duration', 0)
+                upload_date = vod.get('upload_date') or ''
+                if not upload_date and vod.get('timestamp'):
+                    # Unprocessed entries may only carry a timestamp
+                    upload_date = time.strftime('%Y%m%d', time.gmtime(vod['timestamp']))
+                if upload_date:
+                    upload_date = _format_upload_date(upload_date)
+                
+                # Flat entries may only carry an ID, build the URL from it if needed
+                vod_url = vod.get('url') or f"https://www.twitch.tv/videos/{vod.get('id')}"
+                if vod_url in seen_urls:
+                    continue
+                seen_urls.add(vod_url)
+                
+                row = (title, duration, upload_date, vod_url)
+                rows_queue.put(row)
+                rows.append(row)
+
+            # Only complete listings are cached, a failed fetch never gets here
+            self._listing_cache.set(cache_key, rows)
+            self._post(lambda: self.ui.update_status(f"Found {len(rows)} VODs"))
+            logger.info(f"Found {len(rows)} VODs for {channel_name}")
                 
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error fetching VODs: {error_msg}", exc_info=True)
-            self.ui.after(0, lambda: self.ui.update_status(f"Error fetching VODs: {str(error_msg)}"))
+            self._post(lambda: self.ui.update_status(f"Error fetching VODs: {str(error_msg)}"))
         finally:
-            self.ui.after(0, lambda: self.ui.fetch_button.configure(state="normal"))
+            rows_queue.put(None)
 
     def select_all_vods(self):
         """Select all VODs in the list"""
-        for checkbox, _ in self.ui.vod_checkboxes:
-            checkbox.select()
+        self.ui.select_all_vods()
         logger.debug("Selected all VODs")
 
     def pause_downloads(self):
         """Toggle between pause and resume downloads"""
         if self.is_paused:
             # Resume downloads
-            self.is_paused = False
+            self._pause_event.clear()
             self.ui.pause_button.configure(
                 text="Pause Downloads",
                 fg_color="darkred",
@@ -125,11 +335,11 @@ class TwitchVODArchiver:
             logger.info("Downloads resumed by user")
             
             # If we still have items in the queue, process them
-            if hasattr(self.ui, 'download_queue') and self.ui.download_queue:
+            if self.ui.download_queue:
                 self._process_download_queue()
         else:
             # Pause downloads
-            self.is_paused = True
+            self._pause_event.set()
             self.ui.pause_button.configure(
                 text="Resume Downloads",
                 fg_color="#006400",  # Dark green
@@ -138,32 +348,58 @@ class TwitchVODArchiver:
             self.ui.update_status("Downloads paused")
             logger.info("Downloads paused by user")
 
+    def _discard_unselected_restored(self, selected_vods):
+        """Drop restored VODs the user unticked from the saved queue; returns how many"""
+        if not self._restored_paths:
+            return 0
+        selected_urls = {url for _, url, _ in selected_vods}
+        discarded = [url for url in self._restored_paths if url not in selected_urls]
+        if discarded:
+            self._queue_store.remove(discarded)
+            for url in discarded:
+                del self._restored_paths[url]
+            logger.info(f"Discarded {len(discarded)} restored downloads")
+        return len(discarded)
+
     def download_selected(self):
         """Start downloading selected VODs"""
         selected_vods = self.ui.get_selected_vods()
+        discarded = self._discard_unselected_restored(selected_vods)
         if not selected_vods:
-            self.ui.update_status("No VODs selected")
+            self.ui.update_status(f"Discarded {discarded} restored downloads" if discarded else "No VODs selected")
+            return
+        selected_vods = [vod for vod in selected_vods if vod[1] not in self._pending_urls]
+        if not selected_vods:
+            self.ui.update_status("Selected VODs are already queued")
             return
 
-        download_path = self.ui.get_download_path()
-        if not os.path.exists(download_path):
+        download_path = os.path.expanduser(self.ui.get_download_path())
+        # Only touch the filesystem when the path has changed since the last batch
+        if download_path != self._prepared_download_path:
             try:
-                os.makedirs(download_path)
-                logger.info(f"Created download directory: {download_path}")
-            except Exception as e:
+                os.makedirs(download_path, exist_ok=True)
+            except OSError as e:
                 error_msg = str(e)
                 logger.error(f"Error creating download directory: {error_msg}", exc_info=True)
                 self.ui.update_status(f"Error creating download directory: {error_msg}")
                 return
+            self._prepared_download_path = download_path
 
-        self.ui.download_queue = getattr(self.ui, 'download_queue', [])
-        self.ui.download_queue.extend(selected_vods)
+        # Snapshot the path now so changing it mid-queue only affects later batches;
+        # restored VODs go back to the folder they were first queued for
+        queued = [
+            (checkbox, url, vod_title, self._restored_paths.pop(url, download_path))
+            for checkbox, url, vod_title in selected_vods
+        ]
+        self.ui.download_queue.extend(queued)
+        self._pending_urls.update(url for _, url, _, _ in queued)
+        self._queue_store.add((url, vod_title, path) for _, url, vod_title, path in queued)
         
         logger.info(f"Added {len(selected_vods)} VODs to download queue")
         
         # Reset pause state if it was paused before
         if self.is_paused:
-            self.is_paused = False
+            self._pause_event.clear()
             self.ui.pause_button.configure(
                 text="Pause Downloads",
                 fg_color="darkred",
@@ -177,39 +413,81 @@ class TwitchVODArchiver:
             self._process_download_queue()
 
     def _process_download_queue(self):
-        """Process the download queue"""
-        if not hasattr(self.ui, 'download_queue') or not self.ui.download_queue or self.is_paused:
-            self.ui.currently_downloading = False
+        """Start queued downloads until the worker pool is full"""
+        if self._stop_event.is_set():
+            # The pool is shut down; late cleanup callbacks mustn't submit more work
+            return
+        while self.ui.download_queue and not self.is_paused and len(self._active_futures) < MAX_CONCURRENT_DOWNLOADS:
+            checkbox, url, vod_title, download_path = self.ui.download_queue.popleft()
+            
+            # The worker gets plain values so it never has to read the widgets
+            future = self._pool.submit(self._download_vod_thread, checkbox, url, vod_title, download_path)
+            self._active_futures.add(future)
+            # Clean up on the UI thread once the worker has fully finished
+            future.add_done_callback(
+                lambda f, u=url, t=vod_title: self._post(lambda: self._cleanup_download_state(f, u, t))
+            )
+            logger.info(f"Submitted download for: {vod_title}")
+
+        self.ui.currently_downloading = bool(self._active_futures)
+        if not self._active_futures:
+            if self._chat_futures:
+                # Chat downloads are still running and report their own status;
+                # _on_chat_download_done comes back here when the last one finishes
+                return
             self.ui.update_status("Ready" if not self.is_paused else "Downloads paused")
             # If queue is empty, disable the pause button
-            if not hasattr(self.ui, 'download_queue') or not self.ui.download_queue:
+            if not self.ui.download_queue:
                 self.ui.pause_button.configure(state="disabled")
-            return
 
-        self.ui.currently_downloading = True
-        checkbox, url = self.ui.download_queue.pop(0)
-        
-        thread = threading.Thread(target=self._download_vod_thread, args=(checkbox, url))
-        thread.daemon = True
-        thread.start()
-        logger.info(f"Started download thread for: {checkbox.cget('text')}")
+    def _update_overall_progress(self):
+        """Show the average progress of all running downloads"""
+        with self._progress_lock:
+            values = list(self._progress.values())
+        if values:
+            self.ui.update_progress_bar(sum(values) / len(values))
+
+    def _pump_progress(self):
+        """Refresh the progress bar from the latest recorded values, then reschedule"""
+        try:
+            self._update_overall_progress()
+        finally:
+            if not self._stop_event.is_set():
+                self.ui.after(int(PROGRESS_UPDATE_INTERVAL * 1000), self._pump_progress)
+
+    def _set_progress(self, key, progress):
+        """Record the latest progress for a task; safe to call from any thread"""
+        with self._progress_lock:
+            self._progress[key] = progress
+
+    def _finish_progress(self, key):
+        """Stop tracking a task's progress, hiding the bar when nothing is running"""
+        with self._progress_lock:
+            self._progress.pop(key, None)
+            remaining = bool(self._progress)
+        if remaining:
+            self._update_overall_progress()
+        else:
+            self.ui.hide_progress_bar()
 
-    def _download_vod_thread(self, checkbox, url):
+    def _download_vod_thread(self, checkbox, url, vod_title, download_path):
         """Background thread for downloading a VOD"""
-        vod_title = checkbox.cget('text')
-        self.ui.after(0, lambda: [
-            self.ui.update_status(f"Downloading: {vod_title}"),
-            self.ui.show_progress_bar()
-        ])
-        
-        download_path = self.ui.get_download_path()
-        ydl_opts = DOWNLOAD_OPTS.copy()
-        ydl_opts['outtmpl'] = os.path.join(download_path, DEFAULT_OUTPUT_TEMPLATE)
+        import yt_dlp
+
+        self._post(lambda: self.ui.update_status(f"Downloading: {vod_title}"))
+        self._post(self.ui.show_progress_bar)
         
+        # Last logged progress, so the log only gets an entry every 10%
+        state = {'last_logged': 0.0}
+
         # Define the progress hook with progress bar updates
         def progress_hook(d):
-            if self.is_paused:
-                raise Exception("Download paused by user")
+            # Hold the download while paused instead of aborting it, so the
+            # connection stays open and resuming continues from the current fragment
+            while self._pause_event.is_set() and not self._stop_event.is_set():
+                self._stop_event.wait(PAUSE_POLL_INTERVAL)
+            if self._stop_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("Download cancelled")
             
             if d['status'] == 'downloading':
                 # Calculate download progress
@@ -219,136 +497,259 @@ class TwitchVODArchiver:
                 elif 'total_bytes_estimate' in d and d['total_bytes_estimate'] > 0:
                     progress = d['downloaded_bytes'] / d['total_bytes_estimate']
                 
-                # Update progress bar in main thread
-                self.ui.after(0, lambda: self.ui.update_progress_bar(progress))
+                # Just record the value; the UI thread picks it up on its next pump
+                self._set_progress(url, progress)
                 
-                # Log progress occasionally
-                if int(progress * 100) % 10 == 0:  # Log every 10%
+                # Log progress every 10%
+                if progress - state['last_logged'] >= 0.1:
+                    state['last_logged'] = progress
                     logger.debug(f"Download progress for {vod_title}: {progress:.1%}")
-        
-        # Add the progress hook to options
-        ydl_opts['progress_hooks'] = [progress_hook]
+            elif d['status'] == 'finished':
+                self._set_progress(url, 1.0)
         
         try:
             logger.info(f"Starting download for: {vod_title}")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self.current_ydl = ydl
-                self.download_thread = threading.current_thread()
+            ydl, hook = self._get_ydl()
+            hook['fn'] = progress_hook
+            ydl.params['paths'] = {'home': download_path}
+            
+            # Resolve the output filename first so a VOD that's already on disk
+            # isn't downloaded again; the extracted info is reused for the download
+            info = ydl.extract_info(url, download=False)
+            if info is None:
+                raise Exception(f"Could not extract video info for {url}")
+            
+            filename = ydl.prepare_filename(info)
+            if os.path.exists(filename):
+                logger.info(f"Already downloaded: {vod_title} ({filename})")
+            else:
+                # Fail now rather than hours in when the disk fills up
+                needed = self._estimate_download_size(info)
+                free = _free_disk_space(download_path)
+                if needed and free < needed * DISK_SPACE_MARGIN:
+                    raise Exception(
+                        f"Not enough disk space for {vod_title}: "
+                        f"needs ~{needed / 1024**3:.1f} GB, {free / 1024**3:.1f} GB free"
+                    )
                 
                 # Download the video
-                ydl.download([url])
+                ydl.process_ie_result(info, download=True)
                 logger.info(f"Successfully downloaded: {vod_title}")
-                self.ui.after(0, lambda: checkbox.configure(state="disabled"))
-
-                # Check if chat download is enabled
-                if self.chat_ui.is_chat_download_enabled():
-                    logger.info(f"Chat download is enabled, attempting to download chat for: {vod_title}")
-                    self.ui.after(0, lambda: [
-                        self.ui.update_status(f"Downloading chat for: {vod_title}"),
-                        self.ui.show_progress_bar(),
-                        self.ui.update_progress_bar(0)  # Reset progress bar for chat download
-                    ])
-
-                    # Extract video ID from URL
-                    video_id = extract_video_id(url)
-                    logger.info(f"Extracted video ID: {video_id} from URL: {url}")
-                    
-                    if video_id:
-                        # Initialize chat retriever if needed
-                        if not self.chat_retriever:
-                            credentials = self.chat_ui.get_api_credentials()
-                            logger.info(f"Initializing chat retriever with client ID: [REDACTED]")
-                            
-                            # Ensure we have valid credentials
-                            if not credentials['client_id'] or not credentials['client_secret']:
-                                logger.error("Missing API credentials")
-                                self.ui.after(0, lambda: self.ui.update_status("Error: Missing API credentials"))
-                                return
-                                
-                            self.chat_retriever = TwitchChatRetriever(
-                                client_id=credentials["client_id"],
-                                client_secret=credentials["client_secret"]
-                            )
-                        
-                        # Make callback to update chat download progress
-                        def chat_progress_callback(progress):
-                            self.ui.after(0, lambda: self.ui.update_progress_bar(progress))
-                            if progress % 0.1 < 0.01:  # Log every ~10%
-                                logger.debug(f"Chat download progress: {progress:.1%}")
-                        
-                        # Define the chat download completion callback
-                        def on_chat_download_complete():
-                            if self.chat_retriever.success:
-                                logger.info(f"Chat downloaded successfully for: {vod_title}")
-                                self.ui.after(0, lambda: self.ui.update_status(f"Chat downloaded successfully"))
-                            else:
-                                logger.error(f"Error downloading chat for: {vod_title}")
-                                self.ui.after(0, lambda: self.ui.update_status(f"Error downloading chat"))
-
-                        # Download chat to same directory as VOD using async
-                        logger.info(f"Starting chat download for video ID {video_id}")
-                        
-                        # Run the async chat download on a new event loop
-                        def run_async_chat_download():
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
-                            try:
-                                success = loop.run_until_complete(self.chat_retriever.download_chat(
-                                    video_id, 
-                                    download_path,
-                                    progress_callback=chat_progress_callback
-                                ))
-                                self.chat_retriever.success = success
-                                return success
-                            finally:
-                                loop.close()
-                        
-                        # Start chat download in a thread without blocking
-                        chat_thread = threading.Thread(target=lambda: (run_async_chat_download(), on_chat_download_complete()))
-                        chat_thread.daemon = True
-                        chat_thread.start()
-                    else:
-                        logger.warning(f"Could not extract video ID from URL: {url}")
-                        self.ui.after(0, lambda: self.ui.update_status("Could not extract video ID for chat download"))
+            self._queue_store.mark_done(url)
+            self._post(lambda: checkbox.configure(state="disabled"))
+
+            # Check if chat download is wanted; whether the API is set up is checked
+            # on the Tk thread when the download is submitted
+            if self.chat_ui.is_chat_download_requested():
+                logger.info(f"Chat download is enabled, attempting to download chat for: {vod_title}")
+
+                # Extract video ID from URL
+                video_id = extract_video_id(url)
+                logger.info("Extracted video ID: %s from URL: %s", video_id, url)
+                
+                if video_id:
+                    # Queue the chat download without blocking the next VOD
+                    self._post(lambda: self._submit_chat_download(video_id, download_path, vod_title))
                 else:
-                    logger.info(f"Chat download is disabled or not configured properly")
+                    logger.warning(f"Could not extract video ID from URL: {url}")
+                    self._post(lambda: self.ui.update_status("Could not extract video ID for chat download"))
+            else:
+                logger.info(f"Chat download is disabled")
 
         except Exception as e:
             error_msg = str(e)
-            if "paused" in error_msg.lower():
-                logger.info(f"Download paused for: {vod_title}")
-                self.ui.after(0, lambda: self.ui.update_status("Download paused"))
+            if isinstance(e, yt_dlp.utils.DownloadCancelled):
+                logger.info(f"Download cancelled for: {vod_title}")
             else:
                 logger.error(f"Error downloading {vod_title}: {error_msg}", exc_info=True)
-                self.ui.after(0, lambda: self.ui.update_status(f"Error downloading: {error_msg}"))
+                self._post(lambda: self.ui.update_status(f"Error downloading: {error_msg}"))
+
+    def _get_ydl(self):
+        """Return this worker thread's YoutubeDL and its progress hook slot, creating them on first use"""
+        import yt_dlp
+
+        local = self._ydl_local
+        if getattr(local, 'ydl', None) is None:
+            # One instance per pool thread keeps its extractors and HTTP connections
+            # across downloads; each download sets its own hook and output folder.
+            # Fragment threads call the hook through the slot, so it isn't thread-local
+            hook = {'fn': None}
+            local.hook = hook
+            local.ydl = yt_dlp.YoutubeDL(collections.ChainMap({
+                'outtmpl': DEFAULT_OUTPUT_TEMPLATE,
+                # Raise DownloadError instead of only logging it, so a failed VOD
+                # isn't treated as downloaded and stays in the saved queue
+                'ignoreerrors': False,
+                'progress_hooks': [lambda d: hook['fn'](d)],
+            }, DOWNLOAD_OPTS))
+        return local.ydl, local.hook
+
+    @staticmethod
+    def _estimate_download_size(info):
+        """Estimate a VOD's size in bytes from its yt-dlp info, or 0 if unknown"""
+        size = info.get('filesize') or info.get('filesize_approx')
+        if size:
+            return size
+        # HLS formats usually only report a bitrate (in KBit/s)
+        tbr = info.get('tbr')
+        duration = info.get('duration')
+        if tbr and duration:
+            return int(tbr * 1000 / 8 * duration)
+        return 0
+
+    def _submit_chat_download(self, video_id, download_path, vod_title):
+        """Queue a chat download on the chat worker; runs on the Tk thread"""
+        if self._stop_event.is_set():
+            # The chat pool is already shut down
+            return
+        if not self.chat_ui.is_chat_download_enabled():
+            # Ticked without API credentials: untick it and explain, once even when
+            # several VODs finish before the user sees the message
+            if self.chat_ui.is_chat_download_requested():
+                self.chat_ui.reject_chat_download()
+            return
+        future = self._chat_pool.submit(self._download_chat_thread, video_id, download_path, vod_title)
+        self._chat_futures.add(future)
+        future.add_done_callback(lambda f: self._post(lambda: self._on_chat_download_done(f)))
+
+    def _on_chat_download_done(self, future):
+        """Forget a finished chat download and refresh the idle state once nothing is left"""
+        self._chat_futures.discard(future)
+        if not self._chat_futures and not self._active_futures:
+            self._process_download_queue()
+
+    def _download_chat_thread(self, video_id, download_path, vod_title):
+        """Background thread for downloading the chat of a downloaded VOD"""
+        progress_key = f"chat:{video_id}"
+        # Queued chat downloads don't start while downloads are paused
+        while self._pause_event.is_set() and not self._stop_event.is_set():
+            self._stop_event.wait(PAUSE_POLL_INTERVAL)
+        if self._stop_event.is_set():
+            return
+        self._post(lambda: self.ui.update_status(f"Downloading chat for: {vod_title}"))
+        self._post(self.ui.show_progress_bar)
+
+        try:
+            # Initialize chat retriever if needed
+            if not self.chat_retriever:
+                credentials = self.chat_ui.get_api_credentials()
+                logger.info(f"Initializing chat retriever with client ID: [REDACTED]")
+                
+                # Ensure we have valid credentials
+                if not credentials['client_id'] or not credentials['client_secret']:
+                    logger.error("Missing API credentials")
+                    self._post(lambda: self.ui.update_status("Error: Missing API credentials"))
+                    return
+                    
+                self.chat_retriever = TwitchChatRetriever(
+                    client_id=credentials["client_id"],
+                    client_secret=credentials["client_secret"]
+                )
+            
+            # Make callback to update chat download progress
+            chat_state = {'last_logged': 0.0}
+
+            def chat_progress_callback(progress):
+                self._set_progress(progress_key, progress)
+                if progress - chat_state['last_logged'] >= 0.1:  # Log every ~10%
+                    chat_state['last_logged'] = progress
+                    logger.debug(f"Chat download progress: {progress:.1%}")
+
+            # Download chat to same directory as VOD using async
+            logger.info(f"Starting chat download for video ID {video_id}")
+            
+            # Run the async chat download on the chat thread's event loop
+            if self._chat_loop is None:
+                self._chat_loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._chat_loop)
+            if self._stop_event.is_set():
+                return
+            self._chat_task = self._chat_loop.create_task(self.chat_retriever.download_chat(
+                video_id, 
+                download_path,
+                progress_callback=chat_progress_callback
+            ))
+            try:
+                success = self._chat_loop.run_until_complete(self._chat_task)
+            except asyncio.CancelledError:
+                logger.info(f"Chat download cancelled for: {vod_title}")
+                return
+            finally:
+                self._chat_task = None
+            self.chat_retriever.success = success
+
+            if success:
+                logger.info(f"Chat downloaded successfully for: {vod_title}")
+                self._post(lambda: self.ui.update_status(f"Chat downloaded successfully"))
+            else:
+                logger.error(f"Error downloading chat for: {vod_title}")
+                self._post(lambda: self.ui.update_status(f"Error downloading chat"))
+        except Exception as e:
+            logger.error(f"Error downloading chat for {vod_title}: {str(e)}", exc_info=True)
+            self._post(lambda: self.ui.update_status(f"Error downloading chat"))
         finally:
-            # Clean up after download
-            self.ui.after(0, lambda: self._cleanup_download_state(vod_title))
+            self._post(lambda: self._finish_progress(progress_key))
 
-    def _cleanup_download_state(self, vod_title=None):
-        """Clean up the download state and process the next item in queue"""
-        self.current_ydl = None
-        self.download_thread = None
-        
-        self.ui.currently_downloading = False
+    def _close_chat_loop(self):
+        """Close the chat retriever's session and its event loop; runs on the chat thread"""
+        if self._chat_loop is None:
+            return
+        try:
+            if self.chat_retriever:
+                self._chat_loop.run_until_complete(self.chat_retriever.close())
+        finally:
+            self._chat_loop.close()
+            self._chat_loop = None
+
+    def _cleanup_download_state(self, future, url, vod_title=None):
+        """Clean up after a finished download and start the next queued one"""
+        self._active_futures.discard(future)
+        self._pending_urls.discard(url)
         self.ui.download_button.configure(state="normal")
-        self.ui.hide_progress_bar()
+        self._finish_progress(url)
         
         if vod_title:
             logger.debug(f"Cleaned up after download: {vod_title}")
             
-        # Process next in queue if not paused
-        if not self.is_paused and hasattr(self.ui, 'download_queue') and self.ui.download_queue:
-            self._process_download_queue()
-        else:
-            self.ui.update_status("Ready" if not self.is_paused else "Downloads paused")
-            # If queue is empty or we're done, disable the pause button
-            if not hasattr(self.ui, 'download_queue') or not self.ui.download_queue:
-                self.ui.pause_button.configure(state="disabled")
+        # Start the next queued download if not paused
+        self._process_download_queue()
             
+    def _on_close(self):
+        """Abort running downloads and close the application"""
+        logger.info("Closing application")
+        self._stop_event.set()
+        # Drop queued VODs; running ones stop at their next progress hook
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # Queued chat downloads are cancelled one by one rather than with cancel_futures,
+        # which would also cancel the loop cleanup submitted below
+        for future in self._chat_futures:
+            future.cancel()
+        task = self._chat_task
+        if task is not None:
+            try:
+                self._chat_loop.call_soon_threadsafe(task.cancel)
+            except (AttributeError, RuntimeError):
+                # The chat download finished and its loop was closed meanwhile
+                pass
+        # Queued after any running chat download, on the thread that owns the loop
+        self._chat_pool.submit(self._close_chat_loop)
+        self._chat_pool.shutdown(wait=False)
+        self.ui.destroy()
+
+    @staticmethod
+    def _preload_ytdlp():
+        """Import yt_dlp in the background so the first fetch doesn't wait for it"""
+        try:
+            importlib.import_module("yt_dlp")
+        except Exception as e:
+            # The fetch/download threads will report the problem when they import it
+            logger.debug(f"Could not preload yt_dlp: {e}")
+
     def run(self):
         """Start the application"""
         logger.info("Starting application")
+        # The window is built by now; warm up yt_dlp while the user types a channel name
+        threading.Thread(target=self._preload_ytdlp, daemon=True).start()
         self.ui.mainloop()
 
 if __name__ == "__main__":
@@ -5,9 +5,11 @@ Test utility for Twitch chat download - Async Version
 import os
 import sys
 import time
-import json
+import functools
 import logging
 from utils.logging_utils import setup_logging
+from utils import json_utils
+from utils.config_utils import CONFIG_FILE
 import argparse
 import asyncio
 from twitch_chat import TwitchChatRetriever
@@ -16,17 +18,12 @@ from twitch_chat import TwitchChatRetriever
 setup_logging(log_level=logging.DEBUG, log_file="chat_download_test.log")
 logger = logging.getLogger("ChatTest")
 
+@functools.lru_cache(maxsize=1)
 def load_credentials():
     """Load API credentials from config file"""
-    config_file = os.path.join(os.path.expanduser("~"), ".twitch_archiver", "config.json")
-    
-    if not os.path.exists(config_file):
-        logger.error(f"Config file not found: {config_file}")
-        return None, None
-        
     try:
-        with open(config_file, 'r') as f:
-            config = json.load(f)
+        with open(CONFIG_FILE, 'rb') as f:
+            config = json_utils.loads(f.read())
         
         client_id = config.get("client_id", "")
         client_secret = config.get("client_secret", "")
@@ -37,6 +34,9 @@ def load_credentials():
             
         return client_id, client_secret
         
+    except FileNotFoundError:
+        logger.error(f"Config file not found: {CONFIG_FILE}")
+        return None, None
     except Exception as e:
         logger.error(f"Error loading config: {e}")
         return None, None
@@ -46,12 +46,23 @@ def progress_callback(progress):
     progress_str = f"{progress:.1%}"
     print(f"Download progress: {progress_str}", end='\r')
 
+def save_comments(output_file, video_id, title, comments):
+    """Write the comments from a single download method to a JSON file"""
+    with open(output_file, 'wb') as f:
+        f.write(json_utils.dumps({
+            "video_id": video_id,
+            "title": title,
+            "comments": comments
+        }, indent=True))
+
 async def async_main():
     parser = argparse.ArgumentParser(description="Test Twitch chat download")
     parser.add_argument("video_id", help="Twitch video ID (with or without 'v' prefix)")
     parser.add_argument("--output", "-o", default=".", help="Output directory path")
     parser.add_argument("--method", "-m", choices=["cursor", "segments", "sampling", "all"], 
                        default="all", help="Download method to use")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Clear the cached access token and video info before starting")
     args = parser.parse_args()
     
     # Clean up video ID
@@ -70,10 +81,11 @@ async def async_main():
         logger.error("Could not load credentials. Please configure them first.")
         return 1
         
-    # Initialize chat retriever
-    retriever = TwitchChatRetriever(client_id, client_secret)
-    
-    try:
+    # Initialize chat retriever; the session is closed when the block exits
+    async with TwitchChatRetriever(client_id, client_secret) as retriever:
+        if args.no_cache:
+            retriever.clear_cache()
+            
         # Authenticate
         if not await retriever.authenticate():
             logger.error("Authentication failed")
@@ -98,6 +110,7 @@ async def async_main():
         # Download chat
         logger.info("Starting chat download...")
         start_time = time.time()
+        loop = asyncio.get_running_loop()
         
         if args.method == "cursor":
             comments = await retriever._download_chat_by_cursor(video_id, duration_seconds, progress_callback)
@@ -105,12 +118,8 @@ async def async_main():
             if success:
                 # Save to file
                 output_file = os.path.join(args.output, f"{video_id}_chat_cursor.json")
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        "video_id": video_id,
-                        "title": video_info.get('title'),
-                        "comments": comments
-                    }, f, indent=2)
+                # Serialize and write off the event loop
+                await loop.run_in_executor(None, save_comments, output_file, video_id, video_info.get('title'), comments)
                 logger.info(f"Saved {len(comments)} comments to {output_file}")
                 
         elif args.method == "segments":
@@ -119,12 +128,8 @@ async def async_main():
             if success:
                 # Save to file
                 output_file = os.path.join(args.output, f"{video_id}_chat_segments.json")
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        "video_id": video_id,
-                        "title": video_info.get('title'),
-                        "comments": comments
-                    }, f, indent=2)
+                # Serialize and write off the event loop
+                await loop.run_in_executor(None, save_comments, output_file, video_id, video_info.get('title'), comments)
                 logger.info(f"Saved {len(comments)} comments to {output_file}")
                 
         elif args.method == "sampling":
@@ -133,12 +138,8 @@ async def async_main():
             if success:
                 # Save to file
                 output_file = os.path.join(args.output, f"{video_id}_chat_sampling.json")
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        "video_id": video_id,
-                        "title": video_info.get('title'),
-                        "comments": comments
-                    }, f, indent=2)
+                # Serialize and write off the event loop
+                await loop.run_in_executor(None, save_comments, output_file, video_id, video_info.get('title'), comments)
                 logger.info(f"Saved {len(comments)} comments to {output_file}")
                 
         else:  # all - use the normal method
@@ -152,8 +153,6 @@ async def async_main():
         else:
             logger.error(f"Chat download failed after {elapsed:.2f} seconds")
             return 1
-    finally:
-        await retriever.close()
 
 def main():
     """Run the async main function"""
@@ -3,18 +3,236 @@ Twitch Chat Retriever Module for Twitch VOD Archiver - Async Version
 """
 
 import os
-import json
 import time
 import logging
 import asyncio
 import aiohttp
 import datetime
-import threading
 import re
+import math
+import random
+import functools
+import heapq
+import operator
+import concurrent.futures
 from typing import Dict, List, Optional, Tuple, Callable, Any
+from utils.config_utils import CONFIG_DIR, TOKEN_FILE, VIDEO_INFO_CACHE_FILE
+from utils import json_utils
+from utils.cache_utils import SQLiteCache
 
 logger = logging.getLogger("TwitchChatRetriever")
 
+# Buffer size used when writing chat files
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# Matches the numeric ID in Twitch VOD URLs such as https://www.twitch.tv/videos/123456
+_VIDEO_ID_RE = re.compile(r'twitch\.tv/videos/(\d+)')
+
+# Matches each number/unit pair in Twitch durations such as 1h2m3s
+_DURATION_RE = re.compile(r'(\d+)([hms])')
+_DURATION_MULTIPLIERS = {'h': 3600, 'm': 60, 's': 1}
+
+# Characters that aren't allowed in chat file names (anything but letters, digits and " -_.")
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w \-.]')
+
+# Zero-padded "00".."99", so timestamps are built from lookups instead of format specs
+_TWO_DIGITS = tuple(f"{i:02}" for i in range(100))
+
+# Seconds before cached video info is fetched again from the API
+VIDEO_INFO_CACHE_TTL = 24 * 60 * 60
+
+# Headers for Twitch's GQL API, which is called with the website's client ID
+GQL_HEADERS = {
+    "Client-ID": "kimne78kx3ncx6brgo4mv6wki5h1ko",
+    "Content-Type": "application/json"
+}
+
+# Sort key for comments
+_comment_offset = operator.itemgetter("content_offset_seconds")
+
+# Persisted query Twitch's website uses to page through VOD comments
+GQL_COMMENTS_QUERY_HASH = "b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a"
+
+# Maximum number of chat requests in flight at once
+CHAT_MAX_CONCURRENCY = 8
+
+# Pages of comments each chat segment should hold, judged from a probe of the chat's density
+SEGMENT_TARGET_PAGES = 4
+
+# Upper bound on segments per chat download
+MAX_CHAT_SEGMENTS = 50
+
+# Back off once Twitch reports fewer requests than this left in the rate limit window
+RATE_LIMIT_THRESHOLD = 5
+
+# Attempts per request for rate-limited (429), server error (5xx) or connection failures
+MAX_REQUEST_ATTEMPTS = 5
+
+# Seconds before the first retry; doubled for each further attempt
+RETRY_BACKOFF = 0.3
+
+# Longest we'll wait before a retry, even if Twitch's Retry-After asks for more
+MAX_RETRY_DELAY = 10.0
+
+def _comments_query_prefix(video_id: str) -> bytes:
+    """
+    Serialize the comments GQL request for a video up to its offset/cursor variable,
+    so each page request only has to append that one value
+    
+    Args:
+        video_id: Twitch video ID
+        
+    Returns:
+        bytes: The request body with the variables object and outer object left open
+    """
+    return (
+        b'{"operationName":"VideoCommentsByOffsetOrCursor",'
+        b'"extensions":{"persistedQuery":{"version":1,"sha256Hash":"' + GQL_COMMENTS_QUERY_HASH.encode() + b'"}},'
+        b'"variables":{"videoID":' + json_utils.dumps(video_id)
+    )
+
+def _comments_query(prefix: bytes, offset: float = 0, cursor: Optional[str] = None) -> bytes:
+    """
+    Finish a comments GQL request body built by _comments_query_prefix
+    
+    Args:
+        prefix: Serialized request prefix for the video
+        offset: Position in seconds to read from, used when there's no cursor
+        cursor: Pagination cursor from the previous page
+        
+    Returns:
+        bytes: The complete JSON request body
+    """
+    if cursor:
+        return prefix + b',"cursor":' + json_utils.dumps(cursor) + b'}}'
+    return prefix + b',"contentOffsetSeconds":' + str(int(offset)).encode() + b'}}'
+
+class ChatWriter:
+    """
+    Writes comments to the .json, .jsonl and .txt chat files as they are downloaded,
+    so a long VOD's chat never has to be held in memory or serialized all at once.
+    
+    Serializing and writing happen on a single background thread, in the order the
+    batches were given, so the event loop keeps servicing requests meanwhile.
+    """
+    
+    def __init__(self, output_file: str, header: Dict, format_line: Callable[[Dict], str]):
+        """
+        Open the output files and write the JSON envelope
+        
+        Args:
+            output_file: Location of the .json file; the .jsonl and .txt files are placed next to it
+            header: Video fields written before the comments array
+            format_line: Formats one comment as a line of the text file
+        """
+        self.output_file = output_file
+        self.jsonl_file = output_file.replace(".json", ".jsonl")
+        self.txt_file = output_file.replace(".json", ".txt")
+        self.count = 0
+        self._format_line = format_line
+        self._error = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-writer")
+        
+        self._json = open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._jsonl = open(self.jsonl_file, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._txt = open(self.txt_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+        
+        # Write the header object minus its closing brace, then stream the comments array into it
+        self._json.write(json_utils.dumps(header)[:-1])
+        self._json.write(b',"comments":[')
+        self._separator = b"\n"
+        
+    def write(self, comments: List[Dict]):
+        """Queue a batch of comments to be appended, in the order they should appear in the chat"""
+        self.count += len(comments)
+        self._executor.submit(self._write_batch, comments)
+        
+    def _write_batch(self, comments: List[Dict]):
+        """Serialize and write one batch; runs on the writer thread"""
+        if self._error:
+            return
+        try:
+            self._write_comments(comments)
+        except Exception as e:
+            # Remember the first failure and report it from close()
+            self._error = e
+            
+    def _write_comments(self, comments: List[Dict]):
+        """Append a batch of comments to all three files"""
+        if not comments:
+            return
+        # Serialize each comment once and hand every file a single contiguous chunk
+        lines = [json_utils.dumps(comment) for comment in comments]
+        self._json.write(self._separator + b",\n".join(lines))
+        self._separator = b",\n"
+        self._jsonl.write(b"\n".join(lines) + b"\n")
+        self._txt.write("".join(map(self._format_line, comments)))
+        
+    def close(self):
+        """Wait for queued batches, close the comments array and flush all files"""
+        self._executor.shutdown(wait=True)
+        try:
+            self._json.write(b"\n]}\n")
+        finally:
+            self._json.close()
+            self._jsonl.close()
+            self._txt.close()
+        if self._error:
+            raise self._error
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, exc_type, exc, tb):
+        # Waiting for the last batches and flushing the files can take a while for a
+        # big chat, so do it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+class RateLimiter:
+    """
+    Tracks Twitch's Ratelimit-* response headers so requests only wait when the
+    rate limit window is nearly used up, instead of pausing between every request.
+    Shared by all concurrent requests of a retriever.
+    """
+    
+    def __init__(self, threshold: int = RATE_LIMIT_THRESHOLD):
+        self.threshold = threshold
+        self.remaining = None
+        self.reset_at = 0.0
+        
+    def update(self, response):
+        """Record the rate limit state reported by a response"""
+        remaining = response.headers.get("Ratelimit-Remaining")
+        reset = response.headers.get("Ratelimit-Reset")
+        try:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
+        except ValueError:
+            pass
+        if response.status == 429 and remaining is None:
+            # Rate limited without being told for how long
+            self.remaining = 0
+            self.reset_at = time.time() + 1.0
+            
+    async def acquire(self):
+        """Wait for the rate limit window to reset if few enough requests are left in it"""
+        if self.remaining is None or self.remaining >= self.threshold:
+            return
+        delay = min(max(self.reset_at - time.time(), 0.0), 60.0)
+        if delay > 0:
+            logger.debug(f"Rate limit nearly reached, waiting {delay:.1f}s")
+            await asyncio.sleep(delay)
+        # The window has reset; the next response tells us the new state
+        self.remaining = None
+
 class TwitchChatRetriever:
     def __init__(self, client_id: str, client_secret: str):
         """
@@ -31,17 +249,134 @@ class TwitchChatRetriever:
         self.base_url = "https://api.twitch.tv/helix"
         self.gql_url = "https://gql.twitch.tv/gql"
         self._session = None
+        self._session_loop = None
+        # Serialises token refreshes so concurrent callers don't all request a token
+        self._auth_lock = None
+        self._auth_lock_loop = None
+        # Private event loop reused by the *_sync methods
+        self._sync_loop = None
+        # Helix/GQL request headers, rebuilt only when the access token changes
+        self._helix_headers = None
+        self._gql_auth_headers = None
+        self._rate_limiter = RateLimiter()
+        # Video info responses, in memory for this run and on disk across runs
+        self._video_info_cache = {}
+        self._video_info_disk_cache = SQLiteCache(VIDEO_INFO_CACHE_FILE, "video_info", VIDEO_INFO_CACHE_TTL)
+        
+    @property
+    def access_token(self) -> Optional[str]:
+        """The current Helix access token"""
+        return self._access_token
+    
+    @access_token.setter
+    def access_token(self, token: Optional[str]):
+        self._access_token = token
+        # Headers embedding the old token are stale now
+        self._helix_headers = None
+        self._gql_auth_headers = None
+        
+    def _get_helix_headers(self) -> Dict[str, str]:
+        """Headers for Helix API requests, built once per access token"""
+        if self._helix_headers is None:
+            self._helix_headers = {
+                "Client-ID": self.client_id,
+                "Authorization": f"Bearer {self.access_token}"
+            }
+        return self._helix_headers
+    
+    def _get_gql_auth_headers(self) -> Dict[str, str]:
+        """GQL headers plus our access token if we have one, built once per access token"""
+        if self._gql_auth_headers is None:
+            self._gql_auth_headers = dict(GQL_HEADERS)
+            if self.access_token:
+                self._gql_auth_headers["Authorization"] = f"Bearer {self.access_token}"
+        return self._gql_auth_headers
         
     async def get_session(self) -> aiohttp.ClientSession:
-        """Get or create an aiohttp session."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+        """
+        Get or create an aiohttp session.
+        
+        The session is kept between calls so connections to Twitch are reused across
+        authentication, video info and chat requests, and across chat downloads made
+        on the same event loop. A session can't be used from another loop, so a new
+        one is made if the caller is running on a different loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Keep connections to Twitch alive so paginated requests reuse the
+            # same TCP/TLS connection instead of handshaking every time, and
+            # cache DNS lookups for the few hosts we talk to
+            connector = aiohttp.TCPConnector(
+                limit=CHAT_MAX_CONCURRENCY * 2,
+                limit_per_host=CHAT_MAX_CONCURRENCY,
+                keepalive_timeout=75,
+                ttl_dns_cache=300
+            )
+            # No overall deadline, long pagination walks are fine; only fail stalled connections
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, raise_for_status=False)
+            self._session_loop = loop
         return self._session
         
     async def close(self):
         """Close the aiohttp session."""
         if self._session and not self._session.closed:
             await self._session.close()
+            
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        
+    async def _post_gql(self, session: aiohttp.ClientSession, gql_query: bytes, headers: Dict) -> Tuple[int, Any]:
+        """
+        Send a GQL query, waiting out the rate limit first and retrying 429/5xx
+        responses and connection errors with jittered exponential backoff
+        (or Twitch's Retry-After, if given)
+        
+        Args:
+            session: Session to send the request on
+            gql_query: Serialized GQL request body
+            headers: Request headers
+            
+        Returns:
+            tuple: (HTTP status, decoded JSON on 200 or the response text otherwise)
+        """
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            last_attempt = attempt == MAX_REQUEST_ATTEMPTS - 1
+            retry_after = None
+            await self._rate_limiter.acquire()
+            try:
+                async with session.post(self.gql_url, data=gql_query, headers=headers) as response:
+                    self._rate_limiter.update(response)
+                    status = response.status
+                    if status == 200:
+                        return status, json_utils.loads(await response.read())
+                    text = await response.text()
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Dropped connections and timeouts are usually transient too
+                if last_attempt:
+                    raise
+                reason = f"error {type(e).__name__}"
+            else:
+                if (status != 429 and status < 500) or last_attempt:
+                    break
+                reason = str(status)
+                
+            # Jitter spreads out the retries of requests that failed together
+            backoff = RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+            if retry_after:
+                try:
+                    backoff = max(backoff, float(retry_after))
+                except ValueError:
+                    pass
+            backoff = min(backoff, MAX_RETRY_DELAY)
+            logger.debug(f"GQL request failed with {reason}, retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+                
+        return status, text
         
     async def authenticate(self) -> bool:
         """
@@ -53,6 +388,30 @@ class TwitchChatRetriever:
         # Check if we already have a valid token
         if self.access_token and time.time() < self.token_expiry:
             return True
+        
+        # Like the session, a lock belongs to the loop it's used on
+        loop = asyncio.get_running_loop()
+        if self._auth_lock is None or self._auth_lock_loop is not loop:
+            self._auth_lock = asyncio.Lock()
+            self._auth_lock_loop = loop
+            
+        async with self._auth_lock:
+            # Another caller may have refreshed the token while we waited
+            if self.access_token and time.time() < self.token_expiry:
+                return True
+            return await self._request_token()
+            
+    async def _request_token(self) -> bool:
+        """
+        Load a cached access token or request a new one; called with the auth lock held
+        
+        Returns:
+            bool: True if authentication was successful
+        """
+        # Reuse a token issued in a previous run if it hasn't expired yet
+        if self._load_cached_token():
+            logger.info("Using cached Twitch API access token")
+            return True
             
         try:
             auth_url = "https://id.twitch.tv/oauth2/token"
@@ -65,10 +424,11 @@ class TwitchChatRetriever:
             session = await self.get_session()
             async with session.post(auth_url, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = json_utils.loads(await response.read())
                     self.access_token = data["access_token"]
                     # Set expiry with a small buffer before actual expiry
                     self.token_expiry = time.time() + data["expires_in"] - 100
+                    self._save_cached_token()
                     logger.info("Successfully authenticated with Twitch API")
                     return True
                 else:
@@ -79,40 +439,112 @@ class TwitchChatRetriever:
             logger.error(f"Authentication error: {str(e)}", exc_info=True)
             return False
     
-    async def get_video_info(self, video_id: str) -> Optional[Dict]:
+    def _load_cached_token(self) -> bool:
+        """
+        Load an access token saved by a previous run
+        
+        Returns:
+            bool: True if a cached token for this client ID is still valid
+        """
+        try:
+            with open(TOKEN_FILE, 'rb') as f:
+                cached = json_utils.loads(f.read())
+        except (OSError, ValueError):
+            return False
+            
+        if cached.get("client_id") != self.client_id or cached.get("expires_at", 0) <= time.time():
+            return False
+            
+        self.access_token = cached.get("access_token")
+        self.token_expiry = cached["expires_at"]
+        return bool(self.access_token)
+    
+    def _save_cached_token(self):
+        """Persist the current access token so later runs can skip authentication"""
+        tmp_file = TOKEN_FILE + ".tmp"
+        try:
+            os.makedirs(CONFIG_DIR, exist_ok=True)
+            # Create the file owner-readable only, the token grants API access
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json_utils.dumps({
+                    "client_id": self.client_id,
+                    "access_token": self.access_token,
+                    "expires_at": self.token_expiry
+                }))
+            # Swap the new file in so a concurrent reader never sees a half-written token
+            os.replace(tmp_file, TOKEN_FILE)
+        except OSError as e:
+            logger.warning(f"Could not cache access token: {str(e)}")
+    
+    def _clear_cached_token(self):
+        """Forget the current access token, e.g. after Twitch rejected it"""
+        self.access_token = None
+        self.token_expiry = 0
+        try:
+            os.remove(TOKEN_FILE)
+        except OSError:
+            pass
+    
+    def clear_cache(self):
+        """Forget the cached access token and all cached video info, in memory and on disk"""
+        self._clear_cached_token()
+        self._video_info_cache.clear()
+        self._video_info_disk_cache.clear()
+        logger.info("Cleared cached access token and video info")
+    
+    async def get_video_info(self, video_id: str, _retried: bool = False) -> Optional[Dict]:
         """
         Get video information from Twitch API
         
         Args:
             video_id: Twitch video ID (numeric part only)
+            _retried: Internal flag set when retrying after a rejected token
             
         Returns:
             dict: Video information or None if not found
         """
+        # Remove "v" prefix if present
+        if video_id.startswith("v"):
+            video_id = video_id[1:]
+            
+        # Video info doesn't change between calls, so skip the API if we have it
+        video_info = self._video_info_cache.get(video_id)
+        if video_info is None:
+            video_info = self._video_info_disk_cache.get(video_id)
+            if video_info is not None:
+                self._video_info_cache[video_id] = video_info
+        if video_info is not None:
+            logger.debug(f"Using cached video info for {video_id}")
+            return video_info
+            
         if not await self.authenticate():
             return None
             
         try:
-            # Remove "v" prefix if present
-            if video_id.startswith("v"):
-                video_id = video_id[1:]
-                
             url = f"{self.base_url}/videos"
-            headers = {
-                "Client-ID": self.client_id,
-                "Authorization": f"Bearer {self.access_token}"
-            }
+            headers = self._get_helix_headers()
             params = {"id": video_id}
             
             session = await self.get_session()
             async with session.get(url, headers=headers, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = json_utils.loads(await response.read())
                     if data["data"]:
-                        return data["data"][0]
+                        video_info = data["data"][0]
+                        self._video_info_cache[video_id] = video_info
+                        self._video_info_disk_cache.set(video_id, video_info)
+                        return video_info
                     else:
                         logger.warning(f"Video not found: {video_id}")
                         return None
+                elif response.status == 401 and not _retried:
+                    # A cached token may have been revoked; get a fresh one and retry once
+                    logger.warning("Access token rejected, re-authenticating")
+                    self._clear_cached_token()
+                    if not await self.authenticate():
+                        return None
+                    return await self.get_video_info(video_id, _retried=True)
                 else:
                     text = await response.text()
                     logger.error(f"Failed to get video info: {response.status} - {text}")
@@ -161,7 +593,7 @@ class TwitchChatRetriever:
             formatted_date = stream_date.strftime("%Y-%m-%d")
             title = video_info["title"]
             filename = f"{title} - {formatted_date} - Chat.json"
-            safe_filename = "".join(c for c in filename if c.isalnum() or c in " -_.").strip()
+            safe_filename = _UNSAFE_FILENAME_RE.sub("", filename).strip()
             output_file = os.path.join(output_path, safe_filename)
             
             # We'll use Twitch's GQL API to get chat comments
@@ -170,62 +602,58 @@ class TwitchChatRetriever:
             logger.info(f"Downloading chat for video {video_id} (Duration: {video_info['duration']})")
             logger.info(f"Chat will be saved to: {output_file}")
             
-            # Try using the segment-based chat download approach first with parallel requests
-            all_comments = await self._download_chat_by_segments(video_id, total_duration_seconds, progress_callback)
-            
-            if not all_comments:
-                logger.warning("Segment method failed or returned no comments, trying cursor method...")
-                all_comments = await self._download_chat_by_cursor(video_id, total_duration_seconds, progress_callback)
-                
-            if not all_comments:
-                logger.warning("Both methods failed, falling back to offset sampling...")
-                all_comments = await self._download_chat_by_sampling(video_id, total_duration_seconds, progress_callback)
-                
-            logger.info(f"Total comments retrieved: {len(all_comments)}")
-            
-            # Save to file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "video_id": video_id,
-                    "title": video_info["title"],
-                    "streamer": video_info["user_name"],
-                    "created_at": video_info["created_at"],
-                    "comments": all_comments
-                }, f, indent=2)
-                
-            logger.info(f"Successfully downloaded {len(all_comments)} chat messages to {output_file}")
+            header = {
+                "video_id": video_id,
+                "title": video_info["title"],
+                "streamer": video_info["user_name"],
+                "created_at": video_info["created_at"],
+            }
             
-            # Also save as plain text for easier reading
-            txt_file = output_file.replace(".json", ".txt")
-            self._save_as_text(all_comments, txt_file)
+            # Comments are written to the JSON, JSONL and text files page by page
+            # as they arrive instead of being collected in memory first
+            async with ChatWriter(output_file, header, self._format_text_line) as writer:
+                # Segments in parallel first, then a sequential cursor walk, then offset sampling,
+                # moving on only while the previous methods returned no comments
+                methods = (
+                    self._download_chat_by_segments,
+                    self._download_chat_by_cursor,
+                    self._download_chat_by_sampling,
+                )
+                for method in methods:
+                    await method(video_id, total_duration_seconds, progress_callback, sink=writer.write)
+                    if writer.count:
+                        break
+                    logger.warning(f"{method.__name__} failed or returned no comments")
+                    
+            logger.info(f"Total comments retrieved: {writer.count}")
+            logger.info(f"Successfully downloaded {writer.count} chat messages to {output_file}")
+            logger.info(f"Saved chat as text to {writer.txt_file}")
             
             return True
             
         except Exception as e:
             logger.error(f"Error downloading chat: {str(e)}", exc_info=True)
             return False
-        finally:
-            # Ensure session is closed
-            await self.close()
 
-    async def _download_chat_by_cursor(self, video_id, total_duration_seconds, progress_callback=None):
-        """Download chat using cursor-based pagination"""
+    async def _download_chat_by_cursor(self, video_id, total_duration_seconds, progress_callback=None, sink=None):
+        """
+        Download chat using cursor-based pagination
+        
+        If sink is given, each page of comments is passed to it as soon as it arrives
+        and nothing is kept in memory; otherwise all comments are returned as a list.
+        """
         logger.info("Using cursor-based chat download method...")
         
         all_comments = []
         cursor = None
         has_next_page = True
-        processed_edges = set()  # Track processed edges to avoid duplication
-        
-        # GQL headers with the website's client ID
-        headers = {
-            "Client-ID": "kimne78kx3ncx6brgo4mv6wki5h1ko",
-            "Content-Type": "application/json"
-        }
+        # Edges of the previous page; pages only ever overlap at their boundary,
+        # so that's all that needs remembering to avoid duplication
+        previous_edges = set()
         
-        # Optional: add authorization if we have a token
-        if self.access_token:
-            headers["Authorization"] = f"Bearer {self.access_token}"
+        # GQL headers with the website's client ID, plus authorization if we have a token
+        headers = self._get_gql_auth_headers()
+        query_prefix = _comments_query_prefix(video_id)
         
         # Set a reasonable limit for iterations to prevent infinite loops
         max_iterations = 200
@@ -237,268 +665,290 @@ class TwitchChatRetriever:
         while has_next_page and iterations < max_iterations:
             iterations += 1
             
-            # GraphQL query for comments
-            gql_query = {
-                "operationName": "VideoCommentsByOffsetOrCursor",
-                "variables": {
-                    "videoID": video_id
-                },
-                "extensions": {
-                    "persistedQuery": {
-                        "version": 1,
-                        "sha256Hash": "b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a"
-                    }
-                }
-            }
-            
-            # Decide whether to use cursor or offset
+            # GraphQL query for comments; use the cursor if we have one,
+            # otherwise start from the beginning
+            gql_query = _comments_query(query_prefix, 0, cursor)
             if cursor:
-                gql_query["variables"]["cursor"] = cursor
                 logger.debug(f"Using cursor: {cursor}")
             else:
-                # Start from the beginning
-                gql_query["variables"]["contentOffsetSeconds"] = 0
                 logger.debug("Starting from contentOffsetSeconds: 0")
                 
             try:
-                async with session.post(self.gql_url, json=gql_query, headers=headers) as response:
-                    if response.status != 200:
-                        text = await response.text()
-                        logger.error(f"Failed to get comments: {response.status} - {text}")
-                        break
-                        
-                    data = await response.json()
+                status, data = await self._post_gql(session, gql_query, headers)
+                if status != 200:
+                    logger.error(f"Failed to get comments: {status} - {data}")
+                    break
                     
-                    if "errors" in data:
-                        logger.error(f"GQL errors: {data['errors']}")
-                        break
-                        
-                    comments_data = data.get("data", {}).get("video", {}).get("comments", {})
-                    edges = comments_data.get("edges", [])
-                    logger.debug(f"Retrieved {len(edges)} comments in iteration {iterations}")
+                if "errors" in data:
+                    logger.error(f"GQL errors: {data['errors']}")
+                    break
                     
-                    # Check if we got any new edges
-                    if not edges:
-                        logger.warning(f"No comments found in this batch")
-                        break
-                        
-                    # Process edges
-                    new_comments = 0
-                    max_offset = 0
+                comments_data = data.get("data", {}).get("video", {}).get("comments", {})
+                edges = comments_data.get("edges", [])
+                logger.debug(f"Retrieved {len(edges)} comments in iteration {iterations}")
+                
+                # Check if we got any new edges
+                if not edges:
+                    logger.warning(f"No comments found in this batch")
+                    break
                     
-                    for edge in edges:
-                        # Generate a unique ID for this edge to avoid duplication
-                        edge_id = f"{edge.get('cursor', '')}"
-                        
-                        # Skip if we've already processed this edge
-                        if edge_id in processed_edges:
-                            continue
-                            
-                        processed_edges.add(edge_id)
-                        
-                        node = edge.get("node", {})
-                        offset_seconds = node.get("contentOffsetSeconds", 0)
-                        max_offset = max(max_offset, offset_seconds)
-                        
-                        # Create a structured comment object
-                        comment = {
-                            "content_offset_seconds": offset_seconds,
-                            "commenter": {
-                                "display_name": node.get("commenter", {}).get("displayName", "Unknown"),
-                                "id": node.get("commenter", {}).get("id", "")
-                            },
-                            "message": {
-                                "body": self._extract_message_text(node.get("message", {})),
-                            },
-                            "timestamp": node.get("createdAt", "")
-                        }
-                        
-                        all_comments.append(comment)
-                        new_comments += 1
+                # Process edges
+                page_comments = []
+                page_edges = set()
+                max_offset = 0
+                
+                for edge in edges:
+                    # Generate a unique ID for this edge to avoid duplication
+                    edge_id = f"{edge.get('cursor', '')}"
                     
-                    # Check if we got any new comments
-                    if new_comments == 0:
-                        logger.warning("No new comments found, breaking loop")
-                        break
+                    # Skip if we've already processed this edge
+                    if edge_id in previous_edges or edge_id in page_edges:
+                        continue
                         
-                    # Check for pagination
-                    page_info = comments_data.get("pageInfo", {})
-                    has_next_page = page_info.get("hasNextPage", False)
-                    cursor = page_info.get("endCursor", None)
+                    page_edges.add(edge_id)
                     
-                    # If hasNextPage is true but endCursor is None, something's wrong
-                    if has_next_page and not cursor:
-                        logger.warning("hasNextPage is true but no cursor provided, breaking loop")
-                        break
-                        
-                    # Update progress
-                    if progress_callback and total_duration_seconds > 0:
-                        progress = min(0.95, max_offset / total_duration_seconds)  # Cap at 95% to account for final processing
-                        progress_callback(progress)
-                        
-                    logger.debug(f"Progress: {max_offset}/{total_duration_seconds}s = {max_offset/total_duration_seconds:.1%}")
+                    comment = self._build_comment(edge.get("node") or {})
+                    max_offset = max(max_offset, comment["content_offset_seconds"])
+                    page_comments.append(comment)
+                
+                # Check if we got any new comments
+                if not page_comments:
+                    logger.warning("No new comments found, breaking loop")
+                    break
                     
-                    # Add a small delay to avoid rate limiting
-                    await asyncio.sleep(0.5)
+                previous_edges = page_edges
+                if sink:
+                    sink(page_comments)
+                else:
+                    all_comments.extend(page_comments)
+                    
+                # Check for pagination
+                page_info = comments_data.get("pageInfo", {})
+                has_next_page = page_info.get("hasNextPage", False)
+                cursor = page_info.get("endCursor", None)
+                
+                # If hasNextPage is true but endCursor is None, something's wrong
+                if has_next_page and not cursor:
+                    logger.warning("hasNextPage is true but no cursor provided, breaking loop")
+                    break
+                    
+                # Update progress
+                if progress_callback and total_duration_seconds > 0:
+                    progress = min(0.95, max_offset / total_duration_seconds)  # Cap at 95% to account for final processing
+                    progress_callback(progress)
                     
+                logger.debug(f"Progress: {max_offset}/{total_duration_seconds}s = {max_offset/total_duration_seconds:.1%}")
+                
             except Exception as e:
                 logger.error(f"Error during comment fetch: {str(e)}", exc_info=True)
                 break
         
-        # Sort comments by timestamp
-        all_comments.sort(key=lambda c: c["content_offset_seconds"])
+        # Pages were fetched in order, so the comments are already sorted by timestamp
         return all_comments
 
-    async def _download_chat_by_segments(self, video_id, total_duration_seconds, progress_callback=None):
-        """Download chat by breaking video into segments with parallel requests"""
+    async def _download_chat_by_segments(self, video_id, total_duration_seconds, progress_callback=None, sink=None):
+        """
+        Download chat by breaking video into time windows fetched in parallel
+        
+        If sink is given, each batch of segments is passed to it in order once it
+        completes and nothing is kept in memory; otherwise all comments are returned as a list.
+        """
         logger.info("Using segment-based chat download method...")
         
         all_comments = []
+        # Segments cover disjoint time windows and come back in order, so a duplicate
+        # can only share its offset with the previous comment; only hashes seen at
+        # the current offset need remembering
         processed_comments = set()  # To avoid duplicates
-        
-        # Create segments of reasonable size (e.g., 5-10 minutes)
-        segment_size = 300  # 5 minutes in seconds
-        
-        # If the video is very long, use larger segments
-        if total_duration_seconds > 7200:  # 2 hours
-            segment_size = 600  # 10 minutes
-        
-        # Calculate number of segments
-        num_segments = max(1, int(total_duration_seconds / segment_size) + 1)
-        
-        # Cap at a reasonable number of segments
-        max_segments = 50
-        if num_segments > max_segments:
-            logger.warning(f"Capping segments at {max_segments} (from {num_segments})")
-            num_segments = max_segments
-            segment_size = total_duration_seconds / max_segments
-        
-        logger.info(f"Breaking video into {num_segments} segments of ~{segment_size} seconds each")
+        last_offset = None
         
         # Client ID for the Twitch website
-        headers = {
-            "Client-ID": "kimne78kx3ncx6brgo4mv6wki5h1ko",
-            "Content-Type": "application/json"
-        }
+        headers = GQL_HEADERS
+        query_prefix = _comments_query_prefix(video_id)
         
         # Get aiohttp session
         session = await self.get_session()
         
-        # Create a list to store segment tasks
-        segment_tasks = []
+        # Size segments from how busy the chat is, so quiet chats aren't split into
+        # dozens of nearly empty requests
+        num_segments, probe_page = await self._estimate_segment_count(session, query_prefix, total_duration_seconds)
+        if num_segments is None:
+            # Couldn't probe the chat; fall back to 5 minute segments, or 10 for videos over 2 hours
+            fallback_size = 600 if total_duration_seconds > 7200 else 300
+            num_segments = min(MAX_CHAT_SEGMENTS, int(total_duration_seconds / fallback_size) + 1)
+        segment_size = max(total_duration_seconds, 1) / num_segments
+        
+        logger.info(f"Breaking video into {num_segments} segments of ~{segment_size:.0f} seconds each")
+        
+        # Fraction of each segment covered so far, used for overall progress
+        segment_progress = [0.0] * num_segments
         
         # Function to process a segment
-        async def process_segment(segment_id, offset_seconds):
-            # GraphQL query for comments at this offset
-            gql_query = {
-                "operationName": "VideoCommentsByOffsetOrCursor",
-                "variables": {
-                    "videoID": video_id,
-                    "contentOffsetSeconds": offset_seconds
-                },
-                "extensions": {
-                    "persistedQuery": {
-                        "version": 1,
-                        "sha256Hash": "b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a"
-                    }
-                }
-            }
+        async def process_segment(segment_id, start_seconds, end_seconds, first_page=None):
+            """Walk the comment cursor from start_seconds until comments pass end_seconds,
+            starting from first_page instead of a request if it's already been fetched"""
+            segment_comments = []
+            cursor = None
             
-            logger.debug(f"Fetching segment {segment_id+1}/{num_segments} at offset {offset_seconds:.1f}s")
+            logger.debug(f"Fetching segment {segment_id+1}/{num_segments} from {start_seconds:.1f}s")
             
-            try:
-                async with session.post(self.gql_url, json=gql_query, headers=headers) as response:
-                    if response.status != 200:
-                        logger.warning(f"Failed to get comments for segment {segment_id+1}: {response.status}")
-                        return []
-                        
-                    data = await response.json()
+            while True:
+                if first_page is not None:
+                    video_comments, first_page = first_page, None
+                else:
+                    # GraphQL query for comments at this offset or cursor
+                    gql_query = _comments_query(query_prefix, start_seconds, cursor)
                     
+                    try:
+                        status, data = await self._post_gql(session, gql_query, headers)
+                        if status != 200:
+                            logger.warning(f"Failed to get comments for segment {segment_id+1}: {status}")
+                            break
+                            
+                    except Exception as e:
+                        logger.warning(f"Error processing segment {segment_id+1}: {str(e)}")
+                        break
+                        
                     if "errors" in data:
                         logger.warning(f"GQL errors for segment {segment_id+1}: {data['errors']}")
-                        return []
-                        
-                    video_comments = data.get("data", {}).get("video", {}).get("comments", {})
-                    edges = video_comments.get("edges", [])
-                    
-                    logger.debug(f"Segment {segment_id+1}: retrieved {len(edges)} comments")
-                    
-                    segment_comments = []
-                    
-                    for edge in edges:
-                        node = edge.get("node", {})
+                        break
                         
-                        # Create a structured comment
-                        offset = node.get("contentOffsetSeconds", 0)
-                        commenter_id = node.get("commenter", {}).get("id", "")
-                        message_body = self._extract_message_text(node.get("message", {}))
-                        comment_hash = f"{offset}-{commenter_id}-{message_body}"
+                    video_comments = (data.get("data") or {}).get("video", {}).get("comments", {})
+                edges = video_comments.get("edges", [])
+                
+                reached_end = False
+                for edge in edges:
+                    node = edge.get("node") or {}
+                    offset = node.get("contentOffsetSeconds", 0)
+                    if offset < start_seconds:
+                        continue
+                    if offset >= end_seconds:
+                        # The rest of the page belongs to the next segment
+                        reached_end = True
+                        break
                         
-                        segment_comments.append({
-                            "hash": comment_hash,
-                            "comment": {
-                                "content_offset_seconds": offset,
-                                "commenter": {
-                                    "display_name": node.get("commenter", {}).get("displayName", "Unknown"),
-                                    "id": commenter_id
-                                },
-                                "message": {
-                                    "body": message_body
-                                },
-                                "timestamp": node.get("createdAt", "")
-                            }
-                        })
+                    comment = self._build_comment(node)
                     
-                    return segment_comments
+                    # Pair each comment with its dedupe key instead of wrapping it in another dict
+                    segment_comments.append((
+                        (offset, comment["commenter"]["id"], comment["message"]["body"]),
+                        comment
+                    ))
                     
-            except Exception as e:
-                logger.warning(f"Error processing segment {segment_id+1}: {str(e)}")
-                return []
+                    if end_seconds != float("inf"):
+                        segment_progress[segment_id] = (offset - start_seconds) / (end_seconds - start_seconds)
+                
+                page_info = video_comments.get("pageInfo", {})
+                cursor = page_info.get("endCursor")
+                if reached_end or not edges or not page_info.get("hasNextPage", False) or not cursor:
+                    break
+                    
+                if progress_callback:
+                    progress_callback(min(0.95, sum(segment_progress) / num_segments))
+            
+            logger.debug(f"Segment {segment_id+1}: retrieved {len(segment_comments)} comments")
+            segment_progress[segment_id] = 1.0
+            return segment_comments
         
-        # Create tasks for each segment (with concurrency limit)
-        max_concurrent = 5  # Don't overdo it to avoid rate limiting
+        # Limit how many segments are fetched at once rather than waiting for whole batches
+        semaphore = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
         
-        # Create batches of segments
-        for batch_start in range(0, num_segments, max_concurrent):
-            batch_end = min(batch_start + max_concurrent, num_segments)
-            batch_tasks = []
-            
-            for i in range(batch_start, batch_end):
-                offset_seconds = i * segment_size
-                task = asyncio.create_task(process_segment(i, offset_seconds))
-                batch_tasks.append(task)
+        async def fetch_segment(segment_id):
+            start_seconds = segment_id * segment_size
+            # The last segment is open-ended so nothing past the reported duration is lost
+            end_seconds = (segment_id + 1) * segment_size if segment_id < num_segments - 1 else float("inf")
+            # The density probe read the chat from offset 0, which is segment 0's first page
+            first_page = probe_page if segment_id == 0 else None
+            async with semaphore:
+                return await process_segment(segment_id, start_seconds, end_seconds, first_page)
+        
+        tasks = [asyncio.create_task(fetch_segment(i)) for i in range(num_segments)]
+        try:
+            # Await segments in order so comments are emitted in chat order
+            # while later segments keep downloading in the background
+            for task in tasks:
+                segment_comments = await task
                 
-            # Wait for all tasks in this batch to complete
-            batch_results = await asyncio.gather(*batch_tasks)
-            
-            # Process the results from this batch
-            for i, segment_comments in enumerate(batch_results):
-                for comment_data in segment_comments:
+                new_comments = []
+                for comment_key, comment in segment_comments:
+                    offset = comment["content_offset_seconds"]
+                    if offset != last_offset:
+                        processed_comments.clear()
+                        last_offset = offset
+                        
                     # Skip duplicates
-                    if comment_data["hash"] in processed_comments:
+                    if comment_key in processed_comments:
                         continue
                         
-                    processed_comments.add(comment_data["hash"])
-                    all_comments.append(comment_data["comment"])
-                
-                # Update progress after each batch
+                    processed_comments.add(comment_key)
+                    new_comments.append(comment)
+                    
+                if sink:
+                    sink(new_comments)
+                else:
+                    all_comments.extend(new_comments)
+                    
+                # Update progress after each segment
                 if progress_callback:
-                    progress = min(0.95, (batch_start + i + 1) / num_segments)
-                    progress_callback(progress)
-            
-            # Add a small delay between batches to avoid rate limiting
-            await asyncio.sleep(1)
+                    progress_callback(min(0.95, sum(segment_progress) / num_segments))
+        finally:
+            # Don't leave requests running if we're bailing out early
+            for task in tasks:
+                task.cancel()
         
-        # Sort by timestamp and return
-        all_comments.sort(key=lambda c: c["content_offset_seconds"])
+        # Segments were appended in order, so the comments are already sorted by timestamp
         return all_comments
 
-    async def _download_chat_by_sampling(self, video_id, total_duration_seconds, progress_callback=None):
-        """Download chat by sampling points throughout the video with parallel requests"""
+    async def _estimate_segment_count(self, session: aiohttp.ClientSession, query_prefix: bytes,
+                                      total_duration_seconds: int) -> Tuple[Optional[int], Optional[Dict]]:
+        """
+        Pick a segment count from the comment density of the chat's first page
+        
+        Args:
+            session: Session to send the probe request on
+            query_prefix: Comments query prefix for the video
+            total_duration_seconds: Length of the video
+            
+        Returns:
+            tuple: Number of segments to split the chat into (None if the probe failed),
+                and the probed first page's comments object so it isn't requested again
+        """
+        try:
+            status, data = await self._post_gql(session, _comments_query(query_prefix, 0), GQL_HEADERS)
+        except Exception as e:
+            logger.debug(f"Chat density probe failed: {str(e)}")
+            return None, None
+        if status != 200 or "errors" in data:
+            return None, None
+            
+        video_comments = (data.get("data") or {}).get("video", {}).get("comments", {})
+        edges = video_comments.get("edges") or []
+        if not video_comments.get("pageInfo", {}).get("hasNextPage", False):
+            # The whole chat fits on one page
+            return 1, video_comments
+        if not edges:
+            return None, None
+            
+        offsets = [(edge.get("node") or {}).get("contentOffsetSeconds", 0) for edge in edges]
+        # Seconds of chat one page covers; at least 1 so a burst doesn't divide by zero
+        page_span = max(max(offsets) - min(offsets), 1)
+        estimated_pages = total_duration_seconds / page_span
+        num_segments = math.ceil(estimated_pages / SEGMENT_TARGET_PAGES)
+        logger.debug(f"Chat density probe: ~{estimated_pages:.0f} pages of comments")
+        return max(1, min(MAX_CHAT_SEGMENTS, num_segments)), video_comments
+
+    async def _download_chat_by_sampling(self, video_id, total_duration_seconds, progress_callback=None, sink=None):
+        """
+        Download chat by sampling points throughout the video with parallel requests
+        
+        Samples overlap, so comments are only passed to sink (if given) once all of
+        them have been merged and sorted; otherwise they are returned as a list.
+        """
         logger.info("Using sampling-based chat download method...")
         
-        all_comments = []
+        sample_lists = []  # Deduplicated comments from each sample, in timestamp order
         processed_offsets = set()
+        processed_comments = set()  # To avoid duplicates between overlapping samples
         
         # Sample points - use more points for longer videos
         samples = 20
@@ -524,10 +974,8 @@ class TwitchChatRetriever:
         logger.info(f"Using {len(sample_points)} sample points across the video")
         
         # GQL headers
-        headers = {
-            "Client-ID": "kimne78kx3ncx6brgo4mv6wki5h1ko",
-            "Content-Type": "application/json"
-        }
+        headers = GQL_HEADERS
+        query_prefix = _comments_query_prefix(video_id)
         
         # Get aiohttp session
         session = await self.get_session()
@@ -539,187 +987,166 @@ class TwitchChatRetriever:
                 
             processed_offsets.add(offset)
             
-            gql_query = {
-                "operationName": "VideoCommentsByOffsetOrCursor",
-                "variables": {
-                    "videoID": video_id,
-                    "contentOffsetSeconds": offset
-                },
-                "extensions": {
-                    "persistedQuery": {
-                        "version": 1,
-                        "sha256Hash": "b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a"
-                    }
-                }
-            }
+            gql_query = _comments_query(query_prefix, offset)
             
             logger.debug(f"Sampling point {sample_idx+1}/{len(sample_points)} at {offset}s")
             
             try:
-                async with session.post(self.gql_url, json=gql_query, headers=headers) as response:
-                    if response.status != 200:
-                        logger.warning(f"Failed at sample {sample_idx+1}: {response.status}")
-                        return []
-                        
-                    data = await response.json()
-                    
-                    if "errors" in data:
-                        logger.warning(f"GQL errors at sample {sample_idx+1}: {data['errors']}")
-                        return []
-                        
-                    video_comments = data.get("data", {}).get("video", {}).get("comments", {})
-                    edges = video_comments.get("edges", [])
+                status, data = await self._post_gql(session, gql_query, headers)
+                if status != 200:
+                    logger.warning(f"Failed at sample {sample_idx+1}: {status}")
+                    return []
                     
-                    logger.debug(f"Sample {sample_idx+1}: retrieved {len(edges)} comments at {offset}s")
-                    
-                    # Process comments from this sample
-                    sample_comments = []
-                    for edge in edges:
-                        node = edge.get("node", {})
-                        
-                        sample_comments.append({
-                            "content_offset_seconds": node.get("contentOffsetSeconds", 0),
-                            "commenter": {
-                                "display_name": node.get("commenter", {}).get("displayName", "Unknown"),
-                                "id": node.get("commenter", {}).get("id", "")
-                            },
-                            "message": {
-                                "body": self._extract_message_text(node.get("message", {}))
-                            },
-                            "timestamp": node.get("createdAt", "")
-                        })
-                        
-                    return sample_comments
+                if "errors" in data:
+                    logger.warning(f"GQL errors at sample {sample_idx+1}: {data['errors']}")
+                    return []
                     
+                video_comments = data.get("data", {}).get("video", {}).get("comments", {})
+                edges = video_comments.get("edges", [])
+                
+                logger.debug(f"Sample {sample_idx+1}: retrieved {len(edges)} comments at {offset}s")
+                
+                # Process comments from this sample
+                return [self._build_comment(edge.get("node") or {}) for edge in edges]
+                
             except Exception as e:
                 logger.warning(f"Error at sample point {offset}s: {str(e)}")
                 return []
         
-        # Process sample points in batches with concurrency
-        max_concurrent = 5
+        # Fetch all sample points at once, bounded by a semaphore so requests don't
+        # idle waiting for the slowest one in a fixed batch
+        semaphore = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
         
-        for batch_start in range(0, len(sample_points), max_concurrent):
-            batch_end = min(batch_start + max_concurrent, len(sample_points))
-            batch_tasks = []
-            
-            for i in range(batch_start, batch_end):
-                task = asyncio.create_task(process_sample_point(i, sample_points[i]))
-                batch_tasks.append(task)
-                
-            # Wait for all tasks in this batch to complete
-            batch_results = await asyncio.gather(*batch_tasks)
-            
-            # Process the results from this batch
-            for i, sample_comments in enumerate(batch_results):
+        async def fetch_sample_point(sample_idx, offset):
+            async with semaphore:
+                return await process_sample_point(sample_idx, offset)
+        
+        tasks = [asyncio.create_task(fetch_sample_point(i, offset)) for i, offset in enumerate(sample_points)]
+        try:
+            # Collect samples as they finish; they're merged into order afterwards
+            for completed, next_result in enumerate(asyncio.as_completed(tasks), 1):
+                sample_comments = await next_result
+                new_comments = []
                 for comment in sample_comments:
-                    # Check for duplicates
-                    is_duplicate = False
-                    for existing in all_comments:
-                        if (existing["content_offset_seconds"] == comment["content_offset_seconds"] and
-                            existing["commenter"]["id"] == comment["commenter"]["id"] and
-                            existing["message"]["body"] == comment["message"]["body"]):
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        all_comments.append(comment)
+                    # Skip duplicates, using the same key as the segment method
+                    comment_key = (
+                        comment["content_offset_seconds"],
+                        comment["commenter"]["id"],
+                        comment["message"]["body"]
+                    )
+                    if comment_key in processed_comments:
+                        continue
+                        
+                    processed_comments.add(comment_key)
+                    new_comments.append(comment)
+                sample_lists.append(new_comments)
                 
-                # Update progress after each batch
+                # Update progress after each sample
                 if progress_callback:
-                    progress = min(0.95, (batch_start + i + 1) / len(sample_points))
-                    progress_callback(progress)
-            
-            # Add a small delay between batches to avoid rate limiting
-            await asyncio.sleep(1)
+                    progress_callback(min(0.95, completed / len(sample_points)))
+        finally:
+            # Don't leave requests running if we're bailing out early
+            for task in tasks:
+                task.cancel()
         
-        # Sort by timestamp
-        all_comments.sort(key=lambda c: c["content_offset_seconds"])
+        # Each sample is one page, already sorted by timestamp, so a linear merge
+        # puts them in order without re-sorting everything
+        all_comments = list(heapq.merge(*sample_lists, key=_comment_offset))
         
+        if sink:
+            sink(all_comments)
+            return []
         return all_comments
 
+    def _build_comment(self, node: Dict) -> Dict:
+        """
+        Convert a GQL comment node into the comment structure we save
+        
+        Args:
+            node: Comment node from a GQL response
+            
+        Returns:
+            dict: Comment with its offset, commenter, message body and timestamp
+        """
+        # Deleted accounts come back as a null commenter
+        commenter = node.get("commenter") or {}
+        return {
+            "content_offset_seconds": node.get("contentOffsetSeconds", 0),
+            "commenter": {
+                "display_name": commenter.get("displayName", "Unknown"),
+                "id": commenter.get("id", "")
+            },
+            "message": {
+                "body": self._extract_message_text(node.get("message") or {})
+            },
+            "timestamp": node.get("createdAt", "")
+        }
+        
     def _extract_message_text(self, message):
         """Extract text content from message object"""
-        # Check for direct body field
-        if "body" in message and message["body"]:
-            return message["body"]
-        
-        # Try to get text from fragments
-        fragments = message.get("fragments", [])
-        if fragments:
-            text = ""
-            for fragment in fragments:
-                text += fragment.get("text", "")
-            return text
-        
-        return ""
-
-    def _extract_message_body(self, message):
-        """Extract message body from message data"""
-        if "body" in message:
-            return message["body"]
+        # Nearly every message has a body, so check that first
+        body = message.get("body")
+        if body:
+            return body
         
-        # If body is not directly available, try to concatenate fragments
-        fragments = message.get("fragments", [])
-        if fragments:
-            return "".join(frag.get("text", "") for frag in fragments)
-            
-        return ""
+        # Otherwise join the text of its fragments
+        fragments = message.get("fragments")
+        if not fragments:
+            return ""
+        return "".join(fragment.get("text", "") for fragment in fragments)
     
     def _parse_duration(self, duration_str: str) -> int:
         """Parse Twitch duration string (e.g., '1h2m3s') to seconds"""
-        seconds = 0
-        current_num = ""
-        
-        for char in duration_str:
-            if char.isdigit():
-                current_num += char
-            elif char == 'h' and current_num:
-                seconds += int(current_num) * 3600
-                current_num = ""
-            elif char == 'm' and current_num:
-                seconds += int(current_num) * 60
-                current_num = ""
-            elif char == 's' and current_num:
-                seconds += int(current_num)
-                current_num = ""
-                
-        return seconds
-    
-    def _save_as_text(self, comments: List[Dict], output_file: str):
-        """Save comments as readable text file"""
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for comment in comments:
-                    timestamp = self._format_seconds(comment.get("content_offset_seconds", 0))
-                    username = comment.get("commenter", {}).get("display_name", "Unknown")
-                    message = comment.get("message", {}).get("body", "")
-                    f.write(f"[{timestamp}] {username}: {message}\n")
-                    
-            logger.info(f"Saved chat as text to {output_file}")
-            
-        except Exception as e:
-            logger.error(f"Error saving chat as text: {str(e)}", exc_info=True)
+        return sum(int(num) * _DURATION_MULTIPLIERS[unit] for num, unit in _DURATION_RE.findall(duration_str))
     
-    def _format_seconds(self, seconds: float) -> str:
-        """Format seconds as HH:MM:SS"""
-        hours, remainder = divmod(int(seconds), 3600)
+    def _format_text_line(self, comment: Dict) -> str:
+        """Format a comment as a line of the text chat log"""
+        # Called once per comment, so the HH:MM:SS formatting is inlined here
+        hours, remainder = divmod(int(comment.get("content_offset_seconds", 0)), 3600)
         minutes, seconds = divmod(remainder, 60)
-        return f"{hours:02}:{minutes:02}:{seconds:02}"
+        username = comment.get("commenter", {}).get("display_name", "Unknown")
+        message = comment.get("message", {}).get("body", "")
+        return (
+            "[" + (_TWO_DIGITS[hours] if hours < 100 else str(hours)) + ":" + _TWO_DIGITS[minutes]
+            + ":" + _TWO_DIGITS[seconds] + "] " + username + ": " + message + "\n"
+        )
     
     # Synchronous compatibility methods for backward compatibility
+    def _run_sync(self, coro):
+        """
+        Run a coroutine to completion on the retriever's private event loop
+        
+        The loop (and with it the session) is reused by every *_sync call instead of
+        building a new loop per call; call close_sync() when done with the retriever.
+        """
+        if self._sync_loop is None or self._sync_loop.is_closed():
+            self._sync_loop = asyncio.new_event_loop()
+        return self._sync_loop.run_until_complete(coro)
+    
+    def close_sync(self):
+        """Synchronous version of close, also shutting down the loop used by the *_sync methods."""
+        if self._sync_loop is None or self._sync_loop.is_closed():
+            return
+        try:
+            self._sync_loop.run_until_complete(self.close())
+        finally:
+            self._sync_loop.close()
+            self._sync_loop = None
+    
     def authenticate_sync(self) -> bool:
         """Synchronous version of authenticate for backward compatibility."""
-        return asyncio.run(self.authenticate())
+        return self._run_sync(self.authenticate())
     
     def get_video_info_sync(self, video_id: str) -> Optional[Dict]:
         """Synchronous version of get_video_info for backward compatibility."""
-        return asyncio.run(self.get_video_info(video_id))
+        return self._run_sync(self.get_video_info(video_id))
     
     def download_chat_sync(self, video_id: str, output_path: str, progress_callback=None) -> bool:
         """Synchronous version of download_chat for backward compatibility."""
-        return asyncio.run(self.download_chat(video_id, output_path, progress_callback))
+        return self._run_sync(self.download_chat(video_id, output_path, progress_callback))
 
 # For backward compatibility, keep this function
+@functools.lru_cache(maxsize=512)
 def extract_video_id(url: str) -> Optional[str]:
     """
     Extract video ID from Twitch URL
@@ -733,12 +1160,11 @@ def extract_video_id(url: str) -> Optional[str]:
     if not url:
         return None
         
-    if "twitch.tv/videos/" in url:
-        # Extract the numeric part after /videos/
-        match = re.search(r'twitch\.tv/videos/(\d+)', url)
-        if match:
-            logger.info(f"Extracted video ID {match.group(1)} from URL: {url}")
-            return match.group(1)
+    # Extract the numeric part after /videos/
+    match = _VIDEO_ID_RE.search(url)
+    if match:
+        logger.info("Extracted video ID %s from URL: %s", match.group(1), url)
+        return match.group(1)
     
     logger.warning(f"Could not extract video ID from URL: {url}")
     return None
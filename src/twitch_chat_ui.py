@@ -4,16 +4,51 @@ UI Integration for Twitch Chat Downloader
 
 import customtkinter as ctk
 import os
-import json
+import atexit
 import logging
-import requests
-from typing import Dict
+import threading
+import concurrent.futures
+from typing import Dict, Optional
 import webbrowser
 import subprocess
+from utils.config_utils import CONFIG_DIR, CONFIG_FILE
+from utils import json_utils
 
 logger = logging.getLogger("TwitchChatUI")
 
+# How often the UI checks whether credential verification has finished
+VERIFY_POLL_INTERVAL_MS = 100
+
+# HTTP session for credential checks, created on first use so repeated checks reuse the connection
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def _get_http_session():
+    """Return the shared requests session, creating it on first use"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            # requests is only needed here, so don't pay for importing it at startup
+            import requests
+            _http_session = requests.Session()
+            _http_session.headers.update({"User-Agent": "twitch-archiver"})
+            atexit.register(_http_session.close)
+        return _http_session
+
 class TwitchChatUI:
+    # Parsed config.json shared by all instances, re-read only when the file's mtime changes
+    _config_cache: Optional[dict] = None
+    _config_mtime: float = 0.0
+    
+    # Setup steps shown in the API settings dialog, after the developer console link
+    API_INSTRUCTIONS = (
+        "2. Register a new application\n"
+        "3. Enter any name and set OAuth Redirect URL to http://localhost\n"
+        "4. Select Confidential for the Client Type\n"
+        "5. Get the Client ID and generate a Client Secret\n"
+        "6. Enter them below"
+    )
+    
     def __init__(self, master):
         """
         Initialize the Chat downloader UI components
@@ -28,6 +63,12 @@ class TwitchChatUI:
         self.client_secret_var = ctk.StringVar()
         self.is_configured = False
         self.api_status_label = None
+        self.api_window = None
+        self._verifying = False
+        
+        # Plain mirror of the checkbox, so download threads can read it without going through Tcl
+        self._chat_enabled = False
+        self.chat_download_var.trace_add("write", self._on_chat_option_change)
         
         # Load saved credentials if available
         self._load_credentials()
@@ -63,12 +104,25 @@ class TwitchChatUI:
         
     def _show_api_settings(self):
         """Show the API settings dialog"""
+        # The dialog is built once and hidden when closed, so reopening it just shows it again
+        if self.api_window is not None and self.api_window.winfo_exists():
+            self.api_window.deiconify()
+            self.api_window.lift()
+            self.api_window.grab_set()
+            # Don't show a stale message from the last time it was open
+            if self.is_configured:
+                self._update_api_status("API credentials are configured and ready to use", "#4CAF50")
+            else:
+                self._update_api_status("Enter your Twitch API credentials to enable chat downloading")
+            return
+            
         # Create a toplevel window for API settings
         self.api_window = ctk.CTkToplevel(self.master)
         self.api_window.title("Twitch API Settings")
         self.api_window.geometry("600x380")  # Made window taller to accommodate status text and file location
         self.api_window.transient(self.master)
         self.api_window.grab_set()
+        self.api_window.protocol("WM_DELETE_WINDOW", self._hide_api_settings)
         
         # Create the content frame
         frame = ctk.CTkFrame(self.api_window)
@@ -99,17 +153,9 @@ class TwitchChatUI:
         link_button.pack(fill="x", padx=10, pady=5)
 
         # Continue with the rest of the instructions
-        instructions2 = (
-            "2. Register a new application\n"
-            "3. Enter any name and set OAuth Redirect URL to http://localhost\n"
-            "4. Select Confidential for the Client Type\n"
-            "5. Get the Client ID and generate a Client Secret\n"
-            "6. Enter them below"
-        )
-        
         ctk.CTkLabel(
             instructions_frame, 
-            text=instructions2,
+            text=self.API_INSTRUCTIONS,
             justify="left",
             wraplength=480
         ).pack(anchor="w", padx=10, pady=2)
@@ -136,8 +182,6 @@ class TwitchChatUI:
         file_location_frame = ctk.CTkFrame(frame, fg_color="transparent")
         file_location_frame.pack(fill="x", pady=5)
         
-        config_file = os.path.join(os.path.expanduser("~"), ".twitch_archiver", "config.json")
-        
         ctk.CTkLabel(
             file_location_frame, 
             text="Credentials File:", 
@@ -151,7 +195,7 @@ class TwitchChatUI:
             height=28,
             fg_color="#555555",
             hover_color="#777777",
-            command=lambda: self._update_api_status(f"Credentials stored at: {config_file}", "#4CAF50")
+            command=lambda: self._update_api_status(f"Credentials stored at: {CONFIG_FILE}", "#4CAF50")
         )
         show_location_btn.pack(side="left", padx=5)
         
@@ -183,7 +227,7 @@ class TwitchChatUI:
             text="Cancel",
             fg_color="#555555",
             hover_color="#777777",
-            command=self.api_window.destroy
+            command=self._hide_api_settings
         ).pack(side="right", padx=5)
         
         # Add status label at bottom
@@ -203,18 +247,27 @@ class TwitchChatUI:
         if self.is_configured:
             self._update_api_status("API credentials are configured and ready to use", "#4CAF50")
         
+    def _hide_api_settings(self):
+        """Hide the API settings dialog, keeping its widgets for the next time it's opened"""
+        if self.api_window is not None and self.api_window.winfo_exists():
+            self.api_window.grab_release()
+            self.api_window.withdraw()
+        
     def _update_api_status(self, message, color="#999999"):
         """Update the status text in the API settings window"""
-        if self.api_status_label:
+        # The window may have been closed while verification was running
+        if self.api_status_label and self.api_status_label.winfo_exists():
             self.api_status_label.configure(text=message, text_color=color)
-            self.api_status_label.update()
         
     def _open_link(self, url):
         """Open a link in the default web browser"""
         webbrowser.open_new(url)
     
     def _save_credentials(self):
-        """Save the API credentials"""
+        """Verify the API credentials on a worker thread, then save them"""
+        if self._verifying:
+            return
+            
         client_id = self.client_id_var.get().strip()
         client_secret = self.client_secret_var.get().strip()
         
@@ -222,65 +275,111 @@ class TwitchChatUI:
             self._show_error("Both Client ID and Client Secret are required.")
             return
         
-        # Verify the credentials by attempting to get an access token
+        self._update_api_status("Verifying credentials with Twitch API...", "#FFA500")
+        self.master.update_status("Verifying API credentials...")
+        
+        # The request can take a while, so keep it off the Tk thread and poll for the result
+        self._verifying = True
+        future = concurrent.futures.Future()
+        
+        def verify():
+            future.set_result(self._verify_credentials_worker(client_id, client_secret))
+            
+        threading.Thread(target=verify, daemon=True).start()
+        self.master.after(VERIFY_POLL_INTERVAL_MS, self._finish_verification, future, client_id, client_secret)
+        
+    @staticmethod
+    def _verify_credentials_worker(client_id, client_secret):
+        """
+        Check the credentials by requesting an access token; runs on a worker thread
+        
+        Returns:
+            tuple: (True if the credentials are valid, error message if not)
+        """
+        auth_url = "https://id.twitch.tv/oauth2/token"
+        params = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "grant_type": "client_credentials"
+        }
+        
         try:
-            self._update_api_status("Verifying credentials with Twitch API...", "#FFA500")
+            response = _get_http_session().post(auth_url, params=params, timeout=5)
+        except Exception as e:
+            return False, f"Error verifying credentials: {str(e)}"
             
-            auth_url = "https://id.twitch.tv/oauth2/token"
-            params = {
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "grant_type": "client_credentials"
-            }
+        if response.status_code != 200:
+            logger.error(f"API credential verification failed: {response.status_code}")
+            return False, "Invalid credentials. Please check your Client ID and Secret."
             
-            self.master.update_status("Verifying API credentials...")
-            response = requests.post(auth_url, params=params)
+        logger.info("API credentials verified successfully")
+        return True, None
+        
+    def _finish_verification(self, future, client_id, client_secret):
+        """Save the credentials once verification succeeds; runs on the Tk thread"""
+        if not future.done():
+            self.master.after(VERIFY_POLL_INTERVAL_MS, self._finish_verification, future, client_id, client_secret)
+            return
             
-            if response.status_code != 200:
-                self._update_api_status("Invalid credentials. Please check your Client ID and Secret.", "#FF0000")
-                self._show_error("Invalid credentials. Please check your Client ID and Secret.")
-                logger.error(f"API credential verification failed: {response.status_code}")
-                return
-                
-            logger.info("API credentials verified successfully")
-            self._update_api_status("Credentials verified successfully! Saving...", "#4CAF50")
-                
-        except Exception as e:
-            self._update_api_status(f"Error: {str(e)}", "#FF0000")
-            self._show_error(f"Error verifying credentials: {str(e)}")
+        self._verifying = False
+        ok, message = future.result()
+        if not ok:
+            self._update_api_status(message, "#FF0000")
+            self._show_error(message)
             return
+            
+        self._update_api_status("Credentials verified successfully! Saving...", "#4CAF50")
         
         # Save credentials to a config file
-        config_dir = os.path.join(os.path.expanduser("~"), ".twitch_archiver")
-        os.makedirs(config_dir, exist_ok=True)
+        os.makedirs(CONFIG_DIR, exist_ok=True)
         
-        config_file = os.path.join(config_dir, "config.json")
-        config = {
-            "client_id": client_id,
-            "client_secret": client_secret
-        }
+        # Keep any other settings in the file, such as use_aria2c
+        try:
+            config = dict(self._read_config() or {})
+        except (OSError, ValueError):
+            config = {}
+        config["client_id"] = client_id
+        config["client_secret"] = client_secret
         
         try:
-            with open(config_file, 'w') as f:
-                json.dump(config, f)
+            with open(CONFIG_FILE, 'wb') as f:
+                f.write(json_utils.dumps(config))
             
+            # Keep the cache in step with what we just wrote so it isn't read back
+            TwitchChatUI._config_cache = config
+            TwitchChatUI._config_mtime = os.stat(CONFIG_FILE).st_mtime
             self.is_configured = True
             self._update_api_status("Credentials saved successfully!", "#4CAF50")
-            self.master.after(1000, self.api_window.destroy)  # Close after 1 second
+            self.master.after(1000, self._hide_api_settings)  # Close after 1 second
             self.master.update_status("API credentials verified and saved successfully.")
         except Exception as e:
             self._update_api_status(f"Error saving: {str(e)}", "#FF0000")
             self._show_error(f"Error saving credentials: {str(e)}")
     
+    @classmethod
+    def _read_config(cls) -> Optional[dict]:
+        """Return the parsed config file, reading it only if it changed since the last read"""
+        try:
+            mtime = os.stat(CONFIG_FILE).st_mtime
+        except FileNotFoundError:
+            return None
+        
+        if cls._config_cache is None or mtime != cls._config_mtime:
+            with open(CONFIG_FILE, 'rb') as f:
+                config = json_utils.loads(f.read())
+            # Trim hand-edited values once here; saved values are already trimmed
+            for key in ("client_id", "client_secret"):
+                if isinstance(config.get(key), str):
+                    config[key] = config[key].strip()
+            cls._config_cache = config
+            cls._config_mtime = mtime
+        return cls._config_cache
+    
     def _load_credentials(self):
         """Load saved API credentials if available"""
-        config_file = os.path.join(os.path.expanduser("~"), ".twitch_archiver", "config.json")
-        
         try:
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                
+            config = self._read_config()
+            if config:
                 self.client_id_var.set(config.get("client_id", ""))
                 self.client_secret_var.set(config.get("client_secret", ""))
                 
@@ -311,27 +410,39 @@ class TwitchChatUI:
             command=error_window.destroy
         ).pack(pady=10)
     
+    def _on_chat_option_change(self, *args):
+        """Keep the mirrored checkbox state up to date"""
+        self._chat_enabled = self.chat_download_var.get() == "1"
+    
+    def is_chat_download_requested(self) -> bool:
+        """Check if the chat option is ticked; safe to call from download threads"""
+        return self._chat_enabled
+
     def is_chat_download_enabled(self) -> bool:
-        """Check if chat download is enabled"""
+        """Check if chat download is enabled; safe to call from download threads"""
         # Only enable if configured and checkbox is checked
-        enabled = self.chat_download_var.get() == "1"
+        enabled = self._chat_enabled
         configured = self.is_configured
         
-        logger.info(f"Chat download enabled: {enabled}, configured: {configured}")
+        logger.info("Chat download enabled: %s, configured: %s", enabled, configured)
         
-        if enabled and not configured:
-            logger.warning("Chat download requested but API not configured")
-            self._show_error("API credentials must be configured first. Click 'API Settings' to set them up.")
-            self.chat_download_var.set("0")
-            return False
-            
         return enabled and configured
 
+    def reject_chat_download(self):
+        """Untick the chat option and explain why; runs on the Tk thread"""
+        logger.warning("Chat download requested but API not configured")
+        self.chat_download_var.set("0")
+        self._show_error("API credentials must be configured first. Click 'API Settings' to set them up.")
+
     def get_api_credentials(self) -> Dict[str, str]:
-        """Get the API credentials"""
+        """Get the saved API credentials"""
+        try:
+            config = self._read_config() or {}
+        except (OSError, ValueError):
+            config = {}
         credentials = {
-            "client_id": self.client_id_var.get().strip(),
-            "client_secret": self.client_secret_var.get().strip()
+            "client_id": config.get("client_id", ""),
+            "client_secret": config.get("client_secret", "")
         }
         
         # Check if credentials are valid
@@ -342,7 +453,7 @@ class TwitchChatUI:
 
     def _open_config_folder(self):
         """Open the folder containing the config file"""
-        config_dir = os.path.join(os.path.expanduser("~"), ".twitch_archiver")
+        config_dir = CONFIG_DIR
         
         # Create directory if it doesn't exist
         os.makedirs(config_dir, exist_ok=True)
@@ -2,10 +2,27 @@
 UI Implementation for Twitch VOD Archiver
 """
 
+import collections
+import threading
+import subprocess
+import sys
 import customtkinter as ctk
-from ui_config import COLORS, PADDING, DIMENSIONS, LABELS, WINDOW_SIZE, WINDOW_TITLE, VIDEO_FILTERS, CLIP_RANGES
+from ui_config import COLORS, PADDING, WIDGET_PADX, WIDGET_PADY, DIMENSIONS, LABELS, WINDOW_SIZE, WINDOW_TITLE, VIDEO_FILTERS, CLIP_RANGES
 import os
 
+# VOD titles longer than this are shortened in the list; long labels make every
+# row's layout more expensive. The full title is kept for downloads and logs
+MAX_TITLE_LENGTH = 80
+
+def _shorten_title(title: str) -> str:
+    """Cut a title down to MAX_TITLE_LENGTH characters for display"""
+    if len(title) <= MAX_TITLE_LENGTH:
+        return title
+    return title[:MAX_TITLE_LENGTH - 3] + "..."
+
+# Minimum milliseconds between status label redraws; messages in between are coalesced
+STATUS_UPDATE_INTERVAL_MS = 100
+
 class TwitchUI(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -15,11 +32,20 @@ class TwitchUI(ctk.CTk):
         self.geometry(WINDOW_SIZE)
         
         # Initialize variables first
-        self.vod_checkboxes = []
-        self.download_queue = []
+        # VOD list as parallel lists, with one selection flag per row kept up to
+        # date by the checkbox callbacks so reading the selection never asks Tk
+        self._vod_widgets = []
+        self._vod_urls = []
+        self._vod_titles = []
+        self._vod_selected = bytearray()
+        self.download_queue = collections.deque()
         self.currently_downloading = False
         self.filter_var = ctk.StringVar()
         self.clip_range_var = ctk.StringVar()
+        # Latest status message waiting for the throttle to expire, and whether
+        # a flush of it is already scheduled
+        self._pending_status = None
+        self._status_flush_scheduled = False
         
         # Set default values
         self.filter_var.set("All Videos")
@@ -91,6 +117,8 @@ class TwitchUI(ctk.CTk):
         
         # Bind filter change event
         self.filter_var.trace_add("write", self._on_filter_change)
+        self.clip_range_var.trace_add("write", self._update_filter_url)
+        self._update_filter_url()
         
         self.fetch_button = ctk.CTkButton(
             self.channel_frame,
@@ -100,6 +128,15 @@ class TwitchUI(ctk.CTk):
         )
         self.fetch_button.pack(side="left", **PADDING["WIDGET"])
 
+        # Fetches reuse a recent listing of the channel; this one always asks Twitch
+        self.refresh_button = ctk.CTkButton(
+            self.channel_frame,
+            text=LABELS["REFRESH"],
+            fg_color=COLORS["BUTTON"],
+            hover_color=COLORS["BUTTON_HOVER"]
+        )
+        self.refresh_button.pack(side="left", **PADDING["WIDGET"])
+
     def _create_path_frame(self):
         """Create the download path frame"""
         self.path_frame = ctk.CTkFrame(self, fg_color=COLORS["FRAME"])
@@ -127,7 +164,7 @@ class TwitchUI(ctk.CTk):
             text="Explore",
             fg_color=COLORS["BUTTON"],
             hover_color=COLORS["BUTTON_HOVER"],
-            command=lambda: os.startfile(self.path_entry.get())
+            command=self._open_explorer
         )
         self.explore_button.pack(side="left", **PADDING["WIDGET"])
 
@@ -186,21 +223,100 @@ class TwitchUI(ctk.CTk):
 
     def add_vod_checkbox(self, title, duration, upload_date, url):
         """Add a VOD checkbox to the list"""
-        checkbox_text = f"{title} ({duration}s) - {upload_date}"
-        var = ctk.StringVar()
-        checkbox = ctk.CTkCheckBox(self.vod_scrollable_frame, text=checkbox_text, variable=var)
-        checkbox.pack(anchor="w", **PADDING["WIDGET"])
-        self.vod_checkboxes.append((checkbox, url))
+        self._add_vod_row(
+            f"{_shorten_title(title)} ({duration}s) - {upload_date}",
+            url,
+            f"{title} ({duration}s) - {upload_date}"
+        )
+
+    def _add_vod_row(self, checkbox_text, url, full_title):
+        """Create and pack the checkbox for one VOD with an already formatted label"""
+        index = len(self._vod_widgets)
+        checkbox = ctk.CTkCheckBox(
+            self.vod_scrollable_frame,
+            text=checkbox_text,
+            command=lambda: self._toggle_vod(index)
+        )
+        checkbox.pack(anchor="w", padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self._vod_widgets.append(checkbox)
+        self._vod_urls.append(url)
+        self._vod_titles.append(full_title)
+        self._vod_selected.append(0)
+
+    def add_restored_vod(self, full_title, url):
+        """Add a ticked VOD left over from an earlier session's download queue"""
+        self._add_vod_row(_shorten_title(full_title), url, full_title)
+        self._vod_widgets[-1].select()
+        self._vod_selected[-1] = 1
+
+    def _toggle_vod(self, index):
+        """Record a click on a VOD checkbox"""
+        # Without a Tk variable the checkbox keeps its state in Python, so this is cheap
+        self._vod_selected[index] = 1 if self._vod_widgets[index].get() else 0
+
+    def add_vod_checkboxes_batch(self, rows):
+        """Add many VOD checkboxes at once from (title, duration, upload_date, url) rows"""
+        # Format every label first so the loop below only makes Tk calls
+        labels = [
+            (f"{_shorten_title(title)} ({duration}s) - {upload_date}", f"{title} ({duration}s) - {upload_date}")
+            for title, duration, upload_date, _ in rows
+        ]
+        # Tk defers geometry management to idle time, so packing every row in
+        # one callback costs a single relayout instead of one per VOD
+        add_row = self._add_vod_row
+        for (label, full_title), row in zip(labels, rows):
+            add_row(label, row[3], full_title)
 
     def clear_vod_list(self):
         """Clear all VODs from the list"""
-        for checkbox, _ in self.vod_checkboxes:
+        for checkbox in self._vod_widgets:
             checkbox.destroy()
-        self.vod_checkboxes.clear()
+        self._vod_widgets.clear()
+        self._vod_urls.clear()
+        self._vod_titles.clear()
+        self._vod_selected.clear()
+
+    def select_all_vods(self):
+        """Tick every VOD in the list"""
+        for checkbox in self._vod_widgets:
+            checkbox.select()
+        # select() doesn't run the checkbox callbacks, so set the flags directly
+        self._vod_selected[:] = b"\x01" * len(self._vod_widgets)
+
+    def _open_explorer(self):
+        """Open the download folder in the file manager without blocking the UI"""
+        path = os.path.expanduser(self.path_entry.get())
+        if not os.path.isdir(path):
+            self.update_status(f"Folder does not exist: {path}")
+            return
+        if os.name == 'nt':  # Windows
+            # Starting Explorer can stall for a moment, so do it off the Tk thread
+            threading.Thread(target=os.startfile, args=(path,), daemon=True).start()
+            return
+        # Elsewhere hand the folder to the desktop's opener; Popen returns right away
+        opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
+        try:
+            subprocess.Popen([opener, path])
+        except OSError as e:
+            self.update_status(f"Could not open folder: {e}")
 
     def update_status(self, message: str):
-        """Update the status label"""
+        """Update the status label, redrawing it at most every STATUS_UPDATE_INTERVAL_MS"""
+        if self._status_flush_scheduled:
+            # Bursts of messages only redraw once, showing the latest
+            self._pending_status = message
+            return
         self.status_label.configure(text=message)
+        self._status_flush_scheduled = True
+        self.after(STATUS_UPDATE_INTERVAL_MS, self._flush_status)
+
+    def _flush_status(self):
+        """Show the last message that arrived while the status label was throttled"""
+        message = self._pending_status
+        self._pending_status = None
+        self._status_flush_scheduled = False
+        if message is not None:
+            self.update_status(message)
 
     def get_channel_name(self) -> str:
         """Get the entered channel name"""
@@ -211,8 +327,11 @@ class TwitchUI(ctk.CTk):
         return self.path_entry.get()
 
     def get_selected_vods(self):
-        """Get list of selected VODs"""
-        return [(cb, url) for cb, url in self.vod_checkboxes if cb.get()]
+        """Get (checkbox, url, full title) for each selected VOD"""
+        widgets = self._vod_widgets
+        urls = self._vod_urls
+        titles = self._vod_titles
+        return [(widgets[i], urls[i], titles[i]) for i, selected in enumerate(self._vod_selected) if selected]
 
     def _on_filter_change(self, *args):
         """Show/hide clip range dropdown based on filter selection"""
@@ -220,14 +339,20 @@ class TwitchUI(ctk.CTk):
             self.clip_range_dropdown.pack(side="left", **PADDING["WIDGET"])
         else:
             self.clip_range_dropdown.pack_forget()
+        self._update_filter_url()
 
-    def get_selected_filter(self):
-        """Get the currently selected filter URL"""
+    def _update_filter_url(self, *args):
+        """Recompute the filter URL whenever the filter or clip range changes"""
         filter_type = self.filter_var.get()
         if filter_type == "Clips":
             range_value = CLIP_RANGES[self.clip_range_var.get()]
-            return f"clips?filter=clips&range={range_value}"
-        return VIDEO_FILTERS[filter_type]
+            self._active_filter_url = f"clips?filter=clips&range={range_value}"
+        else:
+            self._active_filter_url = VIDEO_FILTERS[filter_type]
+
+    def get_selected_filter(self):
+        """Get the currently selected filter URL; safe to call from worker threads"""
+        return self._active_filter_url
 
     def show_progress_bar(self):
         """Show the progress bar and reset it to 0"""
@@ -3,38 +3,47 @@ UI Configuration file for Twitch VOD Archiver
 Contains all UI-related constants and theme settings
 """
 
+from types import MappingProxyType
+
+# The tables below are read-only views so no widget code can change the theme by accident
+
 # Window settings
 WINDOW_SIZE = "842x500"
 WINDOW_TITLE = "Twitch VOD Archiver"
 
 # Twitch theme colors
-COLORS = {
+COLORS = MappingProxyType({
     "BUTTON": "#9147FF",         # Twitch purple
     "BUTTON_HOVER": "#772CE8",   # Darker Twitch purple
     "ACTIVE": "#9147FF",         # Twitch teal accent
     "ACTIVE_HOVER": "#772CE8",   # Darker teal
     "BACKGROUND": "#0E0E10",     # Twitch dark background
     "FRAME": "#18181B",          # Twitch darker gray
-}
+})
 
 # Padding and spacing
-PADDING = {
-    "FRAME": {"padx": 10, "pady": 5},
-    "WIDGET": {"padx": 5, "pady": 2},
-}
+PADDING = MappingProxyType({
+    "FRAME": MappingProxyType({"padx": 10, "pady": 5}),
+    "WIDGET": MappingProxyType({"padx": 5, "pady": 2}),
+})
+
+# Widget padding as plain values, for code that packs one widget per VOD
+WIDGET_PADX = PADDING["WIDGET"]["padx"]
+WIDGET_PADY = PADDING["WIDGET"]["pady"]
 
 # Widget dimensions
-DIMENSIONS = {
+DIMENSIONS = MappingProxyType({
     "CHANNEL_ENTRY_WIDTH": 200,
     "PATH_ENTRY_WIDTH": 300,
     "VOD_LIST_HEIGHT": 300,
-}
+})
 
 # Text content
-LABELS = {
+LABELS = MappingProxyType({
     "CHANNEL": "Channel Name:",
     "PATH": "Download Path:",
     "FETCH": "Fetch VODs",
+    "REFRESH": "Refresh",
     "BROWSE": "Browse",
     "DOWNLOAD": "Download Selected",
     "SELECT_ALL": "Select All",
@@ -44,21 +53,21 @@ LABELS = {
     "EXPLORE": "Explore",
     "FILTER_TYPE": "Filter Type:",
     "CLIP_RANGE": "Clip Range:",
-}
+})
 
 # Video filter options
-VIDEO_FILTERS = {
+VIDEO_FILTERS = MappingProxyType({
     "All Videos": "videos?filter=all&sort=time",
     "Highlights": "videos?filter=highlights",
     "Uploads": "videos?filter=uploads&sort=time",
     "Collections": "videos?filter=collections",
     "Clips": "clips",
-}
+})
 
-CLIP_RANGES = {
+CLIP_RANGES = MappingProxyType({
     "Last 24 Hours": "24hr",
     "Last 7 Days": "7d",
     "Last 30 Days": "30d",
     "All Time": "all"
-}
+})
 
@@ -0,0 +1,102 @@
+"""
+Small SQLite-backed key/value cache with a time-to-live, for API responses that rarely change
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from utils import json_utils
+
+logger = logging.getLogger("TwitchVODArchiver")
+
+
+class SQLiteCache:
+    """
+    Persistent JSON cache stored in a single SQLite table
+
+    Entries older than the TTL are treated as missing so they get refreshed.
+    Failures to read or write the database are logged and otherwise ignored,
+    the cache is only ever an optimisation.
+    """
+
+    def __init__(self, path: str, table: str, ttl: float):
+        """
+        Initialize the cache
+
+        Args:
+            path: Location of the SQLite database file
+            table: Name of the table holding this cache's entries
+            ttl: Seconds after which an entry is considered stale
+        """
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use and make sure the table exists"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Callers may be on different worker threads; access is serialised by _lock
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, json BLOB, ts REAL)"
+            )
+        return self._conn
+
+    def get(self, key: str):
+        """
+        Look up a cached value
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached object, or None if missing or older than the TTL
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    f"SELECT json, ts FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read cache {self.path}: {str(e)}")
+            return None
+
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json_utils.loads(row[0])
+
+    def set(self, key: str, value):
+        """
+        Store a value in the cache
+
+        Args:
+            key: Cache key
+            value: JSON-serialisable object
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, json, ts) VALUES (?, ?, ?)",
+                        (key, json_utils.dumps(value), time.time())
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write cache {self.path}: {str(e)}")
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(f"DELETE FROM {self.table}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not clear cache {self.path}: {str(e)}")
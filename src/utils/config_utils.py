@@ -0,0 +1,30 @@
+"""
+Shared locations of the per-user configuration files
+"""
+
+import os
+
+from utils import json_utils
+
+# All user-specific state lives under ~/.twitch_archiver
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".twitch_archiver")
+CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+TOKEN_FILE = os.path.join(CONFIG_DIR, "token.json")
+VIDEO_INFO_CACHE_FILE = os.path.join(CONFIG_DIR, "video_info.sqlite")
+CHANNEL_LISTING_CACHE_FILE = os.path.join(CONFIG_DIR, "channel_listings.sqlite")
+DOWNLOAD_QUEUE_FILE = os.path.join(CONFIG_DIR, "download_queue.sqlite")
+
+
+def load_config() -> dict:
+    """
+    Read the user's config file
+
+    Returns:
+        dict: The parsed settings, or an empty dict if the file is missing or unreadable
+    """
+    try:
+        with open(CONFIG_FILE, 'rb') as f:
+            config = json_utils.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    return config if isinstance(config, dict) else {}
@@ -0,0 +1,41 @@
+"""
+JSON helpers that use orjson when it is installed and fall back to the standard library
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, everything works without it
+    orjson = None
+
+
+def dumps(obj, indent: bool = False) -> bytes:
+    """
+    Serialize an object to UTF-8 encoded JSON
+    
+    Args:
+        obj: Object to serialize
+        indent: Pretty-print with two-space indentation
+        
+    Returns:
+        bytes: The encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """
+    Deserialize a JSON document
+    
+    Args:
+        data: JSON as bytes or str
+        
+    Returns:
+        The decoded object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
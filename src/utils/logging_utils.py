@@ -22,6 +22,13 @@ class UnicodeStreamHandler(logging.StreamHandler):
                 stream = sys.stdout
             else:
                 stream = sys.stdout
+            # Piped or redirected stdout is block buffered; make it flush every line
+            # like a console, so records aren't held back or lost in a crash
+            try:
+                stream.reconfigure(line_buffering=True)
+            except AttributeError:
+                # Wrapped streams and older Pythons can't be reconfigured
+                pass
                 
         super().__init__(stream)
     
@@ -29,8 +36,12 @@ class UnicodeStreamHandler(logging.StreamHandler):
         try:
             msg = self.format(record)
             stream = self.stream
-            stream.write(msg + self.terminator)
-            self.flush()
+            stream.write(msg)
+            stream.write(self.terminator)
+            # Our stdout is line buffered (see __init__), so records already go out
+            # as written; a caller-supplied stream only gets flushed for problems
+            if record.levelno >= logging.WARNING:
+                self.flush()
         except Exception:
             self.handleError(record)
 
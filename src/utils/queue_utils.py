@@ -0,0 +1,113 @@
+"""
+SQLite-backed record of queued VOD downloads, so unfinished ones survive a restart
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("TwitchVODArchiver")
+
+
+class DownloadQueueStore:
+    """
+    Persistent list of VODs that were queued but haven't finished downloading
+
+    Rows are added when VODs are queued and removed once they're on disk, so
+    whatever is left after a crash or restart is the work still to do.
+    Database errors are logged and otherwise ignored; downloads work without it.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store
+
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use and make sure the table exists"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Download workers mark rows done from their own threads; access is serialised by _lock
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL with NORMAL sync survives an app crash without an fsync per commit
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS download_queue "
+                "(url TEXT PRIMARY KEY, title TEXT, download_path TEXT, added REAL)"
+            )
+        return self._conn
+
+    def add(self, items):
+        """
+        Record VODs as queued
+
+        Args:
+            items: Iterable of (url, title, download_path) tuples
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO download_queue (url, title, download_path, added) "
+                        "VALUES (?, ?, ?, ?)",
+                        ((url, title, download_path, now) for url, title, download_path in items)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save download queue {self.path}: {str(e)}")
+
+    def mark_done(self, url: str):
+        """
+        Forget a VOD once it has been downloaded
+
+        Args:
+            url: URL the VOD was queued with
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM download_queue WHERE url = ?", (url,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update download queue {self.path}: {str(e)}")
+
+    def remove(self, urls):
+        """
+        Forget VODs the user no longer wants to download
+
+        Args:
+            urls: Iterable of URLs the VODs were queued with
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany("DELETE FROM download_queue WHERE url = ?", ((url,) for url in urls))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update download queue {self.path}: {str(e)}")
+
+    def pending(self):
+        """
+        List the VODs still waiting to be downloaded
+
+        Returns:
+            List of (url, title, download_path) tuples, oldest first
+        """
+        try:
+            with self._lock:
+                return self._connect().execute(
+                    "SELECT url, title, download_path FROM download_queue ORDER BY added, rowid"
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read download queue {self.path}: {str(e)}")
+            return []
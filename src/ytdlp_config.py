@@ -2,23 +2,28 @@
 Configuration settings for Twitch VOD Archiver
 """
 
+import shutil
+
+from utils.config_utils import load_config
+
 # Options for fetching VOD information
 FETCH_OPTS = {
-    'quiet': False,
-    'extract_flat': True,
-    'force_generic_extractor': True,
-    'verbose': True,
+    'quiet': True,            # Entries go to the UI, don't also print each one to the console
+    'extract_flat': 'in_playlist',  # Only list playlist entries, don't resolve their formats
+    'skip_download': True,
+    'verbose': False,
     'ignoreerrors': True,     # Continue on download errors
+    'ignore_no_formats_error': True,  # Listing doesn't need formats
     'no_warnings': False,     # Show warnings
-    'socket_timeout': 30,     # Timeout for socket connections
+    'socket_timeout': 15,     # Timeout for socket connections
     'geo_bypass': True,       # Try to bypass geo-restrictions
 }
 
 # Base options for downloading VODs
 DOWNLOAD_OPTS = {
-    'quiet': False,
-    'verbose': True,
-    'progress_bar': True,
+    'quiet': True,            # Status and progress are shown in the UI via progress hooks
+    'noprogress': True,       # Skip yt-dlp's console progress line, redrawn for every chunk
+    'verbose': False,
     'format': 'best',
     'ignoreerrors': True,     # Continue on download errors
     'retries': 10,            # Retry failed downloads
@@ -28,9 +33,28 @@ DOWNLOAD_OPTS = {
     'continuedl': True,       # Continue partial downloads
     'no_warnings': False,     # Show warnings
     'socket_timeout': 30,     # Timeout for socket connections
-    'concurrent_fragment_downloads': 5,  # Number of fragments to download concurrently
+    'concurrent_fragment_downloads': 4,  # Number of fragments to download concurrently
     'hls_prefer_native': True,          # Prefer native HLS implementation
+    'buffersize': 65536,                # 64 KiB download buffer for larger sequential writes
+    'http_chunk_size': 10 * 1024 * 1024,  # Request HTTP downloads in 10 MiB ranges
 }
 
+# "use_aria2c": true in config.json hands fragment and HTTP downloads to aria2c (if it's
+# installed), which fetches over parallel connections in native code. Off by default:
+# yt-dlp only hears from aria2c when a download finishes, so the progress bar, pausing
+# and stopping downloads on close don't work while it's in use
+USE_ARIA2C = bool(load_config().get('use_aria2c', False))
+ARIA2C_AVAILABLE = shutil.which('aria2c') is not None
+if USE_ARIA2C and ARIA2C_AVAILABLE:
+    DOWNLOAD_OPTS['external_downloader'] = {'m3u8': 'aria2c', 'http': 'aria2c'}
+    DOWNLOAD_OPTS['external_downloader_args'] = {
+        'aria2c': ['-x', '16', '-s', '16', '-k', '1M', '--summary-interval=0', '--console-log-level=warn']
+    }
+    # aria2c runs its own connections, yt-dlp's fragment concurrency doesn't apply
+    del DOWNLOAD_OPTS['concurrent_fragment_downloads']
+
+# Number of VODs downloaded at the same time
+MAX_CONCURRENT_DOWNLOADS = 2
+
 # Default file naming template
 DEFAULT_OUTPUT_TEMPLATE = '%(title)s - %(uploader)s - %(upload_date)s.%(ext)s'
\ No newline at end of file